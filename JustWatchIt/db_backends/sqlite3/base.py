@@ -0,0 +1,47 @@
+"""
+SQLite tuned for several worker processes sharing one database file.
+
+Every new connection gets write-ahead logging, so readers no longer block the
+writer, NORMAL synchronous mode (fsync at checkpoints rather than every commit;
+durable against application crashes, may lose the last commits on power loss),
+a busy timeout so writers queue for the lock instead of failing with "database is
+locked", and a larger page cache and memory map. Transactions start with BEGIN
+IMMEDIATE, which takes the write lock up front: a deferred transaction that reads
+and then writes can otherwise fail without waiting when another writer got there
+first.
+
+Both can be adjusted in DATABASES['default']['OPTIONS']:
+'pragmas' (merged over PRAGMAS) and 'transaction_mode' (DEFERRED, IMMEDIATE or
+EXCLUSIVE).
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.pragmas = {**PRAGMAS, **params.pop('pragmas', {})}
+        self.transaction_mode = params.pop('transaction_mode', 'IMMEDIATE').upper()
+        if self.transaction_mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(f'transaction_mode must be one of {", ".join(TRANSACTION_MODES)}.')
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f'BEGIN {self.transaction_mode}')
@@ -37,6 +37,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'catalog.slowlog.SlowQueryMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -51,18 +52,28 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'catalog.context_processors.catalog',
+            ],
+            'loaders': [
+                'django.template.loaders.filesystem.Loader',
+                'django.template.loaders.app_directories.Loader',
             ],
         },
     },
 ]
 
+# Compiled templates are kept in memory unless templates are being edited.
+if not DEBUG:
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', TEMPLATES[0]['OPTIONS']['loaders']),
+    ]
+
 WSGI_APPLICATION = 'JustWatchIt.wsgi.application'
 
 DATABASES = {
@@ -72,6 +83,91 @@ DATABASES = {
     }
 }
 
+# Shared by every process, web and run_workers alike, because the cached index counts,
+# movie pages and permission sets are invalidated by signals in whichever process made
+# the change. Redis (REDIS_URL) serves a hit without touching the database and has an
+# atomic incr; without it the database cache is the fallback, where a hit costs one
+# query against catalog_cache (created with `python manage.py createcachetable`).
+# The test runner swaps in LocMemCache.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+            'TIMEOUT': 300,
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            },
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'catalog_cache',
+            'TIMEOUT': 300,
+            'OPTIONS': {
+                'MAX_ENTRIES': 5000,
+            },
+        }
+    }
+
+TEST_RUNNER = 'JustWatchIt.test_runner.CacheClearingRunner'
+
+# Rendered template fragments are identical across workers and cheap to rebuild,
+# so each process keeps its own copy instead of paying a round trip to the shared cache.
+CACHES['fragments'] = {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'fragments',
+    'TIMEOUT': 600,
+}
+
+AUTHENTICATION_BACKENDS = ['catalog.backends.CachedPermissionBackend']
+
+# New passwords are hashed with DJANGO_PASSWORD_HASHER ('pbkdf2', 'argon2' or 'scrypt');
+# the remaining hashers stay listed so existing hashes keep verifying and get upgraded.
+PASSWORD_HASHER = os.environ.get('DJANGO_PASSWORD_HASHER', 'pbkdf2')
+
+ARGON2_TIME_COST = int(os.environ.get('ARGON2_TIME_COST', 2))
+ARGON2_MEMORY_COST = int(os.environ.get('ARGON2_MEMORY_COST', 102400))
+ARGON2_PARALLELISM = int(os.environ.get('ARGON2_PARALLELISM', 8))
+SCRYPT_WORK_FACTOR = int(os.environ.get('SCRYPT_WORK_FACTOR', 2 ** 14))
+
+PASSWORD_HASHERS = {
+    'pbkdf2': ['django.contrib.auth.hashers.PBKDF2PasswordHasher'],
+    'argon2': ['catalog.hashers.TunedArgon2PasswordHasher'],
+    'scrypt': ['catalog.hashers.ScryptPasswordHasher'],
+}[PASSWORD_HASHER] + [
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'catalog.hashers.TunedArgon2PasswordHasher',
+    'catalog.hashers.ScryptPasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+PASSWORD_HASHERS = list(dict.fromkeys(PASSWORD_HASHERS))
+
+# Failed logins per sliding window, counted in the shared cache. Its incr is only
+# atomic on Redis; without REDIS_URL, LOGIN_THROTTLE_STORE=database counts exactly in
+# the ThrottleCounter table instead, with one database write per failed login.
+LOGIN_THROTTLE = {
+    'WINDOW': int(os.environ.get('LOGIN_THROTTLE_WINDOW', 300)),
+    'IP_LIMIT': int(os.environ.get('LOGIN_THROTTLE_IP_LIMIT', 30)),
+    'USERNAME_LIMIT': int(os.environ.get('LOGIN_THROTTLE_USERNAME_LIMIT', 5)),
+    'TRUSTED_PROXIES': int(os.environ.get('LOGIN_THROTTLE_TRUSTED_PROXIES', 0)),
+    'STORE': os.environ.get('LOGIN_THROTTLE_STORE', 'cache'),
+}
+
+# Seconds a loan event waits before it is folded into the loan statistics, so that
+# lower ids from transactions still committing are never skipped.
+LOAN_STATS_SAFETY_LAG = int(os.environ.get('LOAN_STATS_SAFETY_LAG', 30))
+
+# Slow-query log, off unless SLOW_QUERY_LOG names a file; summarize it with slowlog_report.
+SLOW_QUERY_LOG = {
+    'PATH': os.environ.get('SLOW_QUERY_LOG', ''),
+    'THRESHOLD_MS': float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 100)),
+    'EXPLAIN_SAMPLES': int(os.environ.get('SLOW_QUERY_EXPLAIN_SAMPLES', 20)),
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -112,4 +208,9 @@ import dj_database_url
 db_from_env = dj_database_url.config(conn_max_age=500)
 DATABASES['default'].update(db_from_env)
 
+# SQLite gets WAL, a busy timeout and immediate write transactions on every connection
+# (JustWatchIt/db_backends/sqlite3). SQLITE_PROFILE=default keeps Django's plain backend.
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3' and os.environ.get('SQLITE_PROFILE', 'tuned') == 'tuned':
+    DATABASES['default']['ENGINE'] = 'JustWatchIt.db_backends.sqlite3'
+
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
@@ -0,0 +1,32 @@
+from django.core.cache import caches
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+from unittest import TextTestResult
+
+from catalog.cache import LOCMEM_CACHES
+
+
+class ClearCachesMixin:
+    # Test transactions are rolled back but an in-memory cache is not, and the
+    # reused primary keys would otherwise pick up entries left by earlier tests.
+    def startTest(self, test):
+        for cache in caches.all():
+            cache.clear()
+        super().startTest(test)
+
+
+class CacheClearingRunner(DiscoverRunner):
+    """Runs the suite against per-process LocMemCache, cleared before every test."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._locmem_caches = override_settings(CACHES=LOCMEM_CACHES)
+        self._locmem_caches.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._locmem_caches.disable()
+        super().teardown_test_environment(**kwargs)
+
+    def get_resultclass(self):
+        base = super().get_resultclass() or TextTestResult
+        return type(base.__name__, (ClearCachesMixin, base), {})
@@ -18,10 +18,17 @@ from django.urls import path, include
 from django.views.generic import RedirectView
 from django.conf import settings
 from django.conf.urls.static import static
+from django.contrib.auth import views as auth_views
+from catalog.forms import QueuedPasswordResetForm
+from catalog.views import ThrottledLoginView, ThrottledAdminLoginView
 
 urlpatterns = [
+    path('admin/login/', ThrottledAdminLoginView.as_view()),
     path('admin/', admin.site.urls),
     path('catalog/', include('catalog.urls')),
     path('', RedirectView.as_view(url='catalog/', permanent=True)),
+    path('accounts/login/', ThrottledLoginView.as_view(), name='login'),
+    path('accounts/password_reset/', auth_views.PasswordResetView.as_view(form_class=QueuedPasswordResetForm),
+         name='password_reset'),
     path('accounts/', include('django.contrib.auth.urls')),
 ] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
@@ -1,10 +1,13 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 
-from .models import Screenwriter, Genre, Movie, MovieInstance, Director
+from .archive import retire, unretire, CopyOnLoan
+
+from .models import Screenwriter, Genre, Movie, MovieInstance, Director, Branch
 
 class MovieInline(admin.TabularInline):
     model = Movie
     extra = 0
+    exclude = ('version',)
 
 class ScreenwriterAdmin(admin.ModelAdmin):
     list_display = ('last_name', 'first_name', 'date_of_birth', 'date_of_death')
@@ -23,27 +26,59 @@ class DirectorAdmin(admin.ModelAdmin):
 class MovieInstanceInline(admin.TabularInline):
     model = MovieInstance
     extra = 0
+    exclude = ('version', 'retired_on')
 
 @admin.register(Movie)
 class MovieAdmin(admin.ModelAdmin):
     list_display = ('title', 'screenwriter', 'director', 'display_genre')
+    exclude = ('version',)
 
     inlines = [MovieInstanceInline]
 
 @admin.register(MovieInstance)
 class MovieInstanceAdmin(admin.ModelAdmin):
-    list_display = ('movie', 'status', 'borrower', 'due_back', 'id')
-    list_filter = ('status', 'due_back')
+    list_display = ('movie', 'branch', 'status', 'borrower', 'due_back', 'retired_on', 'id')
+    list_filter = ('status', 'branch', 'due_back', 'retired_on')
+    actions = ['retire_copies', 'unretire_copies']
 
     fieldsets = (
         (None, {
-            'fields': ('movie', 'production', 'id')
+            'fields': ('movie', 'production', 'branch', 'id')
         }),
         ('Availability', {
             'fields': ('status', 'due_back', 'borrower')
         }),
     )
 
+    def get_queryset(self, request):
+        # Retired copies stay listed here until archived, so they can be put back.
+        return MovieInstance.all_objects.select_related('movie', 'branch', 'borrower')
+
+    @admin.action(description='Retire selected copies')
+    def retire_copies(self, request, queryset):
+        retired = 0
+        for instance in queryset.filter(retired_on__isnull=True):
+            try:
+                retire(instance)
+            except CopyOnLoan as error:
+                self.message_user(request, str(error), messages.WARNING)
+            else:
+                retired += 1
+        self.message_user(request, f'Retired {retired} copies. They are archived by archive_retired.')
+
+    @admin.action(description='Put selected retired copies back in circulation')
+    def unretire_copies(self, request, queryset):
+        unretired = 0
+        for instance in queryset.filter(retired_on__isnull=False):
+            unretire(instance)
+            unretired += 1
+        self.message_user(request, f'Put {unretired} copies back, in maintenance.')
+
+@admin.register(Branch)
+class BranchAdmin(admin.ModelAdmin):
+    list_display = ('name', 'city', 'address')
+    list_filter = ('city',)
+
 
 admin.site.register(Screenwriter, ScreenwriterAdmin)
 admin.site.register(Genre)
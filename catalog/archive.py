@@ -0,0 +1,110 @@
+import datetime
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from .branches import adjust
+from .loans import refresh_loan_stats, LOAN_STATS_CHECKPOINT
+from .models import ArchivedLoanEvent, ArchivedMovieInstance, Branch, Checkpoint, LoanEvent, Movie, MovieInstance
+
+ARCHIVE_AFTER = datetime.timedelta(days=30)
+BATCH_SIZE = 500
+
+
+class CopyOnLoan(ValueError):
+    pass
+
+
+def retire(instance, when=None):
+    """Take a copy out of circulation. It stays in MovieInstance, hidden, until archived."""
+    if instance.status in ('o', 'r'):
+        raise CopyOnLoan(f'Copy {instance.pk} is lent or reserved and cannot be retired.')
+    instance.status = 'm'
+    instance.retired_on = when or datetime.date.today()
+    instance.save()
+
+
+def unretire(instance):
+    """Put a retired copy that has not been archived yet back, in maintenance."""
+    instance.retired_on = None
+    instance.save()
+
+
+def _copy(source, model, **overrides):
+    attnames = {field.attname for field in model._meta.concrete_fields}
+    values = {field.attname: getattr(source, field.attname)
+              for field in source._meta.concrete_fields if field.attname in attnames}
+    values.update(overrides)
+    return model(**values)
+
+
+def archive_retired(retired_before=None, batch_size=BATCH_SIZE):
+    """
+    Move copies retired on or before retired_before, with their loan events, to the
+    archive tables, one transaction per batch. Returns the number of copies moved.
+    """
+    retired_before = retired_before or datetime.date.today() - ARCHIVE_AFTER
+    # Events are only moved once the loan statistics have counted them; copies with
+    # events still inside the safety lag wait for a later run.
+    refresh_loan_stats()
+    folded = Checkpoint.objects.filter(name=LOAN_STATS_CHECKPOINT).values_list('position', flat=True).first() or 0
+    unfolded = LoanEvent.objects.filter(instance_id=OuterRef('pk'), id__gt=folded)
+    archived = 0
+    while True:
+        with transaction.atomic():
+            batch = list(MovieInstance.all_objects.select_for_update()
+                         .filter(retired_on__lte=retired_before).exclude(Exists(unfolded))
+                         .order_by('retired_on', 'id')[:batch_size])
+            if not batch:
+                return archived
+            ids = [instance.pk for instance in batch]
+            ArchivedMovieInstance.objects.bulk_create([_copy(instance, ArchivedMovieInstance) for instance in batch])
+            events = LoanEvent.objects.filter(instance_id__in=ids)
+            ArchivedLoanEvent.objects.bulk_create([_copy(event, ArchivedLoanEvent) for event in events],
+                                                  batch_size=batch_size)
+            events.delete()
+            MovieInstance.all_objects.filter(pk__in=ids).delete()
+        archived += len(batch)
+
+
+def restore(instance_ids=None, batch_size=BATCH_SIZE):
+    """
+    Bring archived copies back into circulation, in maintenance, with their loan events.
+    Copies of movies deleted since are left in the archive. Returns the number restored.
+    """
+    archived = ArchivedMovieInstance.objects.filter(Exists(Movie.objects.filter(pk=OuterRef('movie_id'))))
+    if instance_ids is not None:
+        archived = archived.filter(pk__in=instance_ids)
+    restored = 0
+    while True:
+        with transaction.atomic():
+            batch = list(archived.order_by('archived', 'id')[:batch_size])
+            if not batch:
+                return restored
+            ids = [copy.pk for copy in batch]
+            events = list(ArchivedLoanEvent.objects.filter(instance_id__in=ids))
+            # Branches and users may have been deleted while the rows were archived.
+            branches = set(Branch.objects.filter(pk__in={copy.branch_id for copy in batch}).values_list('pk', flat=True))
+            users = set(User.objects.filter(pk__in={row.borrower_id for row in batch + events}).values_list('pk', flat=True))
+            movies = set(Movie.objects.filter(pk__in={event.movie_id for event in events}).values_list('pk', flat=True))
+            instances = [
+                _copy(copy, MovieInstance, status='m', retired_on=None,
+                      branch_id=copy.branch_id if copy.branch_id in branches else None,
+                      borrower_id=copy.borrower_id if copy.borrower_id in users else None)
+                for copy in batch
+            ]
+            MovieInstance.all_objects.bulk_create(instances)
+            # bulk_create skips the signals that count copies per branch.
+            per_branch = Counter((instance.branch_id, instance.movie_id) for instance in instances if instance.branch_id)
+            for (branch_id, movie_id), copies in per_branch.items():
+                adjust(branch_id, movie_id, copies=copies)
+            LoanEvent.objects.bulk_create([
+                _copy(event, LoanEvent,
+                      movie_id=event.movie_id if event.movie_id in movies else None,
+                      borrower_id=event.borrower_id if event.borrower_id in users else None)
+                for event in events
+            ], batch_size=batch_size)
+            ArchivedMovieInstance.objects.filter(pk__in=ids).delete()
+        restored += len(batch)
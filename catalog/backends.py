@@ -0,0 +1,41 @@
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+from django.db import transaction
+
+PERMISSIONS_TIMEOUT = 60 * 60
+
+
+def _permissions_key(user_id):
+    return f'auth:perms:{user_id}'
+
+
+def invalidate_permissions(user_ids):
+    if user_ids:
+        caches['default'].delete_many([_permissions_key(user_id) for user_id in user_ids])
+
+
+def invalidate_permissions_on_commit(user_ids):
+    user_ids = list(user_ids)
+    transaction.on_commit(lambda: invalidate_permissions(user_ids))
+
+
+class CachedPermissionBackend(ModelBackend):
+    """
+    ModelBackend whose per-user permission set is kept in the shared cache as a
+    frozenset of 'app_label.codename' strings, so after the first request a
+    permission check costs no queries. Entries are dropped by the m2m_changed
+    receivers in catalog.signals.
+    """
+
+    def get_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        if not hasattr(user_obj, '_perm_cache'):
+            cache = caches['default']
+            key = _permissions_key(user_obj.pk)
+            permissions = cache.get(key)
+            if permissions is None:
+                permissions = frozenset(super().get_all_permissions(user_obj))
+                cache.set(key, permissions, PERMISSIONS_TIMEOUT)
+            user_obj._perm_cache = permissions
+        return user_obj._perm_cache
@@ -0,0 +1,64 @@
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+
+from .models import BranchAvailability, MovieInstance
+
+
+def _ensure_counter(branch_id, movie_id):
+    try:
+        with transaction.atomic():
+            BranchAvailability.objects.get_or_create(branch_id=branch_id, movie_id=movie_id)
+    except IntegrityError:
+        pass
+
+
+def adjust(branch_id, movie_id, copies=0, available=0):
+    if not (copies or available):
+        return
+    if copies > 0 or available > 0:
+        _ensure_counter(branch_id, movie_id)
+    # A decrement never creates a row, so a counter cascaded away with its branch
+    # is not brought back by a late signal.
+    BranchAvailability.objects.filter(branch_id=branch_id, movie_id=movie_id) \
+        .update(copies=F('copies') + copies, available=F('available') + available)
+
+
+def instance_changed(before, after):
+    """
+    Move a copy's contribution between counters. before and after are
+    (branch_id, movie_id, status) tuples, or None for a copy that did not exist.
+    Copies without a branch are not counted anywhere.
+    """
+    deltas = Counter()
+    for state, sign in ((before, -1), (after, 1)):
+        if state is None or state[0] is None or state[1] is None:
+            continue
+        branch_id, movie_id, status = state
+        deltas[branch_id, movie_id, 'copies'] += sign
+        deltas[branch_id, movie_id, 'available'] += sign * (status == 'a')
+    for branch_id, movie_id in {key[:2] for key in deltas}:
+        adjust(branch_id, movie_id,
+               copies=deltas[branch_id, movie_id, 'copies'],
+               available=deltas[branch_id, movie_id, 'available'])
+
+
+def available_at(movie, city=None):
+    """Branches holding a copy of movie that can be borrowed right now, optionally in one city."""
+    counters = BranchAvailability.objects.filter(movie=movie, available__gt=0).select_related('branch')
+    if city:
+        counters = counters.filter(branch__city__iexact=city)
+    return counters.order_by('branch__city', 'branch__name')
+
+
+def rebuild_availability():
+    """Recount every counter from the copies themselves, e.g. after bulk imports that skip signals."""
+    totals = MovieInstance.objects.filter(branch__isnull=False).values('branch_id', 'movie_id') \
+        .annotate(copies=Count('id'), available=Count('id', filter=Q(status='a')))
+    with transaction.atomic():
+        BranchAvailability.objects.all().delete()
+        return len(BranchAvailability.objects.bulk_create(
+            [BranchAvailability(**row) for row in totals.order_by() if row['movie_id'] is not None],
+            batch_size=1000,
+        ))
@@ -0,0 +1,100 @@
+import math
+import random
+import threading
+import time
+import weakref
+
+from django.core.cache import caches
+from django.db import transaction
+
+INDEX_COUNTS_KEY = 'catalog:index-counts'
+MOVIES_FIRST_PAGE_KEY = 'catalog:movies:first-page'
+
+# Per-process caches for the test runner and single-process benchmarks, where nothing
+# else needs to see the entries.
+LOCMEM_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'fragments': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'fragments'},
+}
+
+
+def borrowed_count_key(user_id):
+    return f'catalog:borrowed:{user_id}'
+
+# Weak values: a key's lock lives only while some caller holds it, so per-user keys
+# do not pile up one lock each for the lifetime of the process.
+_local_locks = weakref.WeakValueDictionary()
+_local_locks_guard = threading.Lock()
+
+
+def _local_lock(key):
+    with _local_locks_guard:
+        lock = _local_locks.get(key)
+        if lock is None:
+            lock = _local_locks[key] = threading.Lock()
+        return lock
+
+
+def _expired(entry, beta):
+    # Probabilistic early expiration (XFetch): the closer an entry is to its expiry
+    # and the longer it took to compute, the likelier a reader refreshes it early.
+    _, delta, expires = entry
+    return time.time() - delta * beta * math.log(random.random() or 1e-12) >= expires
+
+
+def _recompute(cache, key, producer, timeout):
+    started = time.time()
+    value = producer()
+    delta = time.time() - started
+    cache.set(key, (value, delta, time.time() + timeout), timeout)
+    return value
+
+
+def get_or_set(key, producer, timeout=300, beta=1.0, lock_timeout=30, cache=None):
+    """
+    Return the cached value for key, computing it with producer() when needed.
+
+    Concurrent misses are coalesced: within a process by a per-key lock and across
+    processes by a short-lived lock entry in the cache, so only one caller recomputes
+    while the others wait for its result or keep serving the previous value.
+    """
+    cache = cache or caches['default']
+    entry = cache.get(key)
+    if entry is not None and not _expired(entry, beta):
+        return entry[0]
+
+    lock = _local_lock(key)
+    if not lock.acquire(blocking=entry is None):
+        return entry[0]
+    try:
+        current = cache.get(key)
+        if current is not None and (entry is None or current[2] != entry[2]):
+            return current[0]
+
+        lock_key = f'{key}:lock'
+        if cache.add(lock_key, True, lock_timeout):
+            try:
+                return _recompute(cache, key, producer, timeout)
+            finally:
+                cache.delete(lock_key)
+
+        if entry is not None:
+            return entry[0]
+        deadline = time.time() + lock_timeout
+        while time.time() < deadline:
+            time.sleep(0.05)
+            current = cache.get(key)
+            if current is not None:
+                return current[0]
+        return _recompute(cache, key, producer, timeout)
+    finally:
+        lock.release()
+
+
+def invalidate(*keys, cache=None):
+    (cache or caches['default']).delete_many(keys)
+
+
+def invalidate_on_commit(*keys, cache=None):
+    # Deleting before the writer commits would let a concurrent reader re-cache the old rows.
+    transaction.on_commit(lambda: invalidate(*keys, cache=cache))
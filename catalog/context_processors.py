@@ -0,0 +1,21 @@
+from .cache import borrowed_count_key, get_or_set
+from .models import MovieInstance
+
+
+def borrowed_count(user_id):
+    return get_or_set(borrowed_count_key(user_id),
+                      lambda: MovieInstance.objects.filter(borrower_id=user_id, status__exact='o').count())
+
+
+def catalog(request):
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return {'can_manage': False, 'auth_state': 'anonymous'}
+
+    # Resolved once per request; templates use these instead of perms lookups per row.
+    can_manage = user.has_perm('catalog.can_mark_returned')
+    if user.is_staff:
+        auth_state = 'staff-manager' if can_manage else 'staff'
+    else:
+        auth_state = 'manager' if can_manage else 'user'
+    return {'can_manage': can_manage, 'auth_state': auth_state, 'borrowed_count': borrowed_count(user.pk)}
@@ -2,9 +2,22 @@ from django import forms
 import datetime
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
+from django.contrib.auth.forms import PasswordResetForm
+from django.template import loader
+from catalog.tasks import send_email
+
+CONFLICT_MESSAGE = _('Someone else changed this record while you were editing it. '
+                     'Check the current values and submit again to overwrite them.')
+
+def report_conflict(form, current_version):
+    # Resubmitting the form as shown overwrites the other change deliberately.
+    form.data = form.data.copy()
+    form.data[form.add_prefix('version')] = current_version
+    form.add_error(None, CONFLICT_MESSAGE)
 
 class RenewMovieForm(forms.Form):
     renewal_date = forms.DateField(help_text="Enter a date between now and 4 weeks.")
+    version = forms.IntegerField(widget=forms.HiddenInput, required=False)
 
     def clean_renewal_date(self):
         data = self.cleaned_data['renewal_date']
@@ -16,3 +29,29 @@ class RenewMovieForm(forms.Form):
             raise ValidationError(_('Invalid date - renewal more than 4 weeks ahead'))
 
         return data
+
+class VersionedModelForm(forms.ModelForm):
+    """Carries the version the editor loaded, so saving fails if the row changed since."""
+    version = forms.IntegerField(widget=forms.HiddenInput, required=False, min_value=1)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk is not None:
+            self.initial.setdefault('version', self.instance.version)
+            # Without it the edit could not be checked, and construct_instance would blank the version.
+            self.fields['version'].required = True
+
+    def save(self, commit=True):
+        if self.cleaned_data.get('version') is not None:
+            self.instance.version = self.cleaned_data['version']
+        return super().save(commit)
+
+class QueuedPasswordResetForm(PasswordResetForm):
+    def send_mail(self, subject_template_name, email_template_name, context, from_email, to_email,
+                  html_email_template_name=None):
+        subject = ''.join(loader.render_to_string(subject_template_name, context).splitlines())
+        body = loader.render_to_string(email_template_name, context)
+        html_body = None
+        if html_email_template_name is not None:
+            html_body = loader.render_to_string(html_email_template_name, context)
+        send_email.delay(subject=subject, body=body, to=[to_email], from_email=from_email, html_body=html_body)
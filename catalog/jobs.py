@@ -0,0 +1,116 @@
+import datetime
+import os
+import socket
+import threading
+import time
+import traceback
+
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+RETRY_BASE_DELAY = datetime.timedelta(seconds=10)
+LOCK_TIMEOUT = datetime.timedelta(minutes=10)
+CLAIM_CANDIDATES = 10
+
+_tasks = {}
+
+
+def task(name=None, max_attempts=5, unique=False):
+    """
+    Register a function as a job. `func.delay(**kwargs)` queues it with JSON kwargs;
+    unique tasks are not queued again while an earlier call is still waiting.
+    """
+    def register(func):
+        task_name = name or f'{func.__module__}.{func.__name__}'
+        _tasks[task_name] = func
+
+        def delay(**kwargs):
+            return enqueue(task_name, kwargs, max_attempts=max_attempts, unique=unique)
+
+        func.task_name = task_name
+        func.delay = delay
+        return func
+    return register
+
+
+def enqueue(task_name, payload=None, max_attempts=5, unique=False, run_after=None):
+    if unique:
+        waiting = Job.objects.filter(task=task_name, status='q').first()
+        if waiting is not None:
+            return waiting
+    return Job.objects.create(
+        task=task_name,
+        payload=payload or {},
+        max_attempts=max_attempts,
+        run_after=run_after or timezone.now(),
+    )
+
+
+def default_worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+
+
+def requeue_stale(now=None):
+    # Jobs of a worker that died mid-run are handed out again after LOCK_TIMEOUT.
+    now = now or timezone.now()
+    return Job.objects.filter(status='r', locked_at__lt=now - LOCK_TIMEOUT) \
+        .update(status='q', locked_by='', locked_at=None)
+
+
+def claim(worker, now=None):
+    now = now or timezone.now()
+    candidates = Job.objects.filter(status='q', run_after__lte=now).values_list('id', flat=True)
+    for job_id in candidates[:CLAIM_CANDIDATES]:
+        claimed = Job.objects.filter(id=job_id, status='q') \
+            .update(status='r', locked_by=worker, locked_at=now, attempts=F('attempts') + 1)
+        if claimed:
+            return Job.objects.get(id=job_id)
+    return None
+
+
+def run(job, worker):
+    changes = {'locked_by': '', 'locked_at': None}
+    try:
+        func = _tasks.get(job.task)
+        if func is None:
+            raise LookupError(f'Unknown task {job.task!r}')
+        func(**job.payload)
+    except Exception:
+        now = timezone.now()
+        changes['last_error'] = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            changes.update(status='f', finished=now)
+        else:
+            changes.update(status='q', run_after=now + RETRY_BASE_DELAY * 2 ** (job.attempts - 1))
+    else:
+        changes.update(status='d', finished=timezone.now(), last_error='')
+    Job.objects.filter(id=job.id, locked_by=worker).update(**changes)
+    return changes['status']
+
+
+def work(worker=None, burst=False, poll_interval=1.0, max_jobs=None):
+    """
+    Run queued jobs until stopped. With burst=True the worker returns as soon as no
+    job is ready, which is how tests and one-off runs drain the queue in-process.
+    """
+    worker = worker or default_worker_name()
+    processed = 0
+    requeue_stale()
+    while max_jobs is None or processed < max_jobs:
+        job = claim(worker)
+        if job is None:
+            if burst:
+                break
+            time.sleep(poll_interval)
+            requeue_stale()
+            continue
+        run(job, worker)
+        processed += 1
+    return processed
+
+
+def purge_finished(older_than=datetime.timedelta(days=7)):
+    deleted, _ = Job.objects.filter(status='d', finished__lt=timezone.now() - older_than).delete()
+    return deleted
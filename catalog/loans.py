@@ -0,0 +1,127 @@
+from datetime import timedelta
+from itertools import takewhile
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import LoanEvent, MovieLoanStats, UserLoanStats, InstanceLoanStats, Checkpoint
+
+LOAN_STATS_CHECKPOINT = 'loan-stats'
+# Seconds an event is left alone after its INSERT, which must exceed the longest
+# time a transaction writing loan events stays open after inserting them.
+DEFAULT_SAFETY_LAG = 30
+
+
+def safety_lag():
+    return timedelta(seconds=getattr(settings, 'LOAN_STATS_SAFETY_LAG', DEFAULT_SAFETY_LAG))
+
+
+def schedule_refresh():
+    from .jobs import enqueue
+    from .tasks import refresh_loan_stats as refresh_task
+    # New events only become foldable once they are older than the safety lag.
+    enqueue(refresh_task.task_name, unique=True, run_after=timezone.now() + safety_lag())
+
+
+def record_loan_event(instance, from_status, to_status):
+    # Written in the same transaction, and savepoint, as the status change itself, so
+    # the history commits or rolls back together with it.
+    with transaction.atomic():
+        LoanEvent.objects.create(
+            instance_id=instance.pk,
+            movie_id=instance.movie_id,
+            borrower_id=instance.borrower_id,
+            from_status=from_status or '',
+            to_status=to_status or '',
+            due_back=instance.due_back,
+        )
+        schedule_refresh()
+
+
+def refresh_loan_stats(batch_size=1000, lag=None):
+    """
+    Fold loan events past the checkpoint into the rollups, in id order.
+
+    Ids are assigned at INSERT but become visible at COMMIT, so a lower id may still
+    be in flight when a higher one is read. Folding stops at the first event recorded
+    less than `lag` ago; by then every lower id has been committed or rolled back.
+    """
+    lag = safety_lag() if lag is None else lag
+    processed = 0
+    while True:
+        with transaction.atomic():
+            settled_before = timezone.now() - lag
+            checkpoint, _ = Checkpoint.objects.select_for_update().get_or_create(name=LOAN_STATS_CHECKPOINT)
+            events = list(LoanEvent.objects.filter(id__gt=checkpoint.position).order_by('id')[:batch_size])
+            settled = list(takewhile(lambda event: event.recorded <= settled_before, events))
+            if not settled:
+                return processed
+            _apply_events(settled)
+            checkpoint.position = settled[-1].id
+            checkpoint.save(update_fields=['position', 'updated'])
+        processed += len(settled)
+        if len(settled) < batch_size:
+            return processed
+
+
+def has_unfolded_events():
+    position = Checkpoint.objects.filter(name=LOAN_STATS_CHECKPOINT).values_list('position', flat=True).first() or 0
+    return LoanEvent.objects.filter(id__gt=position).exists()
+
+
+class _Rollup:
+    def __init__(self, model, keys, **defaults):
+        self.model = model
+        self.defaults = defaults
+        self.existing = model.objects.in_bulk(keys)
+        self.created = {}
+
+    def get(self, key, **defaults):
+        if key is None:
+            return None
+        row = self.existing.get(key) or self.created.get(key)
+        if row is None:
+            row = self.created[key] = self.model(pk=key, **defaults)
+        return row
+
+    def save(self, fields):
+        if self.created:
+            self.model.objects.bulk_create(self.created.values())
+        if self.existing:
+            self.model.objects.bulk_update(self.existing.values(), fields)
+
+
+def _apply_events(events):
+    instance_ids = {event.instance_id for event in events}
+    instances = _Rollup(InstanceLoanStats, instance_ids)
+    movie_ids = {event.movie_id for event in events}
+    movie_ids.update(row.movie_id for row in instances.existing.values())
+    user_ids = {event.borrower_id for event in events}
+    user_ids.update(row.borrower_id for row in instances.existing.values())
+    movies = _Rollup(MovieLoanStats, movie_ids - {None})
+    users = _Rollup(UserLoanStats, user_ids - {None})
+
+    for event in events:
+        copy = instances.get(event.instance_id, movie_id=event.movie_id, tracked_since=event.created)
+        if event.starts_loan:
+            copy.loan_count += 1
+            copy.loan_started = event.created
+            copy.movie_id = event.movie_id
+            copy.borrower_id = event.borrower_id
+            for row in (movies.get(copy.movie_id), users.get(copy.borrower_id)):
+                if row is not None:
+                    row.loan_count += 1
+        elif event.ends_loan and copy.loan_started:
+            duration = max(event.created - copy.loan_started, timedelta())
+            copy.total_loan_time += duration
+            for row in (movies.get(copy.movie_id), users.get(copy.borrower_id)):
+                if row is not None:
+                    row.returned_count += 1
+                    row.total_loan_time += duration
+            copy.loan_started = None
+            copy.borrower_id = None
+
+    instances.save(['movie', 'borrower', 'loan_count', 'total_loan_time', 'loan_started'])
+    movies.save(['loan_count', 'returned_count', 'total_loan_time'])
+    users.save(['loan_count', 'returned_count', 'total_loan_time'])
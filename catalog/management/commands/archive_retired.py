@@ -0,0 +1,19 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from catalog.archive import archive_retired, ARCHIVE_AFTER, BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Move retired movie copies and their loan events to the archive tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=ARCHIVE_AFTER.days,
+                            help='Only archive copies retired at least this many days ago.')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        retired_before = datetime.date.today() - datetime.timedelta(days=options['older_than'])
+        archived = archive_retired(retired_before, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Archived {archived} copies retired on or before {retired_before}.'))
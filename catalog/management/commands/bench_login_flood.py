@@ -0,0 +1,112 @@
+import logging
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from catalog.cache import LOCMEM_CACHES
+from catalog.throttling import login_throttle_settings
+
+UNTHROTTLED = {'IP_LIMIT': None, 'USERNAME_LIMIT': None}
+
+
+class Command(BaseCommand):
+    help = 'Measure catalog page throughput while a login flood hits /accounts/login/.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds per scenario.')
+        parser.add_argument('--readers', type=int, default=4, help='Threads browsing catalog pages.')
+        parser.add_argument('--attackers', type=int, default=8, help='Threads posting bad credentials.')
+        parser.add_argument('--attack-rate', type=float, default=10.0, help='Login attempts per second per attacker.')
+        parser.add_argument('--attacker-ips', type=int, default=2, help='Distinct client addresses of the flood.')
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--locmem-cache', action='store_true',
+                            help='Serve pages from a per-process cache instead of the configured one.')
+
+    def handle(self, *args, **options):
+        self.host = options['host']
+        self.attacker_ips = options['attacker_ips']
+        self.attack_interval = 1 / options['attack_rate']
+        self.pages = [reverse('index'), reverse('movies'), reverse('directors'), reverse('screenwriters')]
+        scenarios = [
+            ('no login traffic', 0, login_throttle_settings()),
+            ('login flood, throttled', options['attackers'], login_throttle_settings()),
+            ('login flood, unthrottled', options['attackers'], {**login_throttle_settings(), **UNTHROTTLED}),
+        ]
+
+        caches = {'CACHES': LOCMEM_CACHES} if options['locmem_cache'] else {}
+        # Every throttled attempt would otherwise log a 429 warning.
+        logging.getLogger('django.request').setLevel(logging.ERROR)
+
+        self.stdout.write(
+            f'{"scenario":<28}{"pages/s":>10}{"p50 ms":>10}{"p95 ms":>10}'
+            f'{"logins/s":>10}{"cpu ms/login":>14}{"429s":>8}{"errors":>8}'
+        )
+        for name, attackers, throttle in scenarios:
+            with override_settings(LOGIN_THROTTLE=throttle, **caches):
+                result = self.run_scenario(options['duration'], options['readers'], attackers)
+            self.stdout.write(
+                f'{name:<28}{result["pages"]:>10.1f}{result["p50"]:>10.1f}{result["p95"]:>10.1f}'
+                f'{result["logins"]:>10.1f}{result["login_cpu"]:>14.1f}{result["throttled"]:>8}{result["errors"]:>8}'
+            )
+
+    def run_scenario(self, duration, readers, attackers):
+        stop_at = time.monotonic() + duration
+        latencies, logins, self.errors = [], [], []
+        threads = [threading.Thread(target=self.browse, args=(stop_at, latencies)) for _ in range(readers)]
+        threads += [threading.Thread(target=self.flood, args=(stop_at, logins, n)) for n in range(attackers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        latencies.sort()
+        return {
+            'pages': len(latencies) / duration,
+            'p50': statistics.median(latencies) * 1000 if latencies else 0.0,
+            'p95': latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0.0,
+            'logins': len(logins) / duration,
+            'login_cpu': statistics.mean(cpu for _, cpu in logins) * 1000 if logins else 0.0,
+            'throttled': sum(status == 429 for status, _ in logins),
+            'errors': len(self.errors),
+        }
+
+    def browse(self, stop_at, latencies):
+        client = Client(HTTP_HOST=self.host)
+        try:
+            n = 0
+            while time.monotonic() < stop_at:
+                started = time.perf_counter()
+                try:
+                    client.get(self.pages[n % len(self.pages)])
+                except Exception as error:
+                    self.errors.append(error)
+                else:
+                    latencies.append(time.perf_counter() - started)
+                n += 1
+        finally:
+            connection.close()
+
+    def flood(self, stop_at, logins, attacker):
+        client = Client(HTTP_HOST=self.host, REMOTE_ADDR=f'10.0.0.{attacker % self.attacker_ips + 1}')
+        try:
+            n = 0
+            next_attempt = time.monotonic()
+            while next_attempt < stop_at:
+                time.sleep(max(0.0, next_attempt - time.monotonic()))
+                next_attempt += self.attack_interval
+                # Thread CPU time is what a worker process would spend on the attempt.
+                started = time.thread_time()
+                try:
+                    response = client.post(reverse('login'), {'username': f'victim{n % 50}', 'password': 'wrong'})
+                except Exception as error:
+                    self.errors.append(error)
+                else:
+                    logins.append((response.status_code, time.thread_time() - started))
+                n += 1
+        finally:
+            connection.close()
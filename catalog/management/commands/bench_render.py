@@ -0,0 +1,77 @@
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.template import RequestContext, Template
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+
+from catalog.models import Movie, Director, Screenwriter
+
+# Row markup as it was rendered before the lean path: a reverse() and a perms lookup per row.
+BASELINE_ROWS = Template("""
+{% for movie in movie_list %}
+  <li>
+    <a href="{{ movie.get_absolute_url }}"><b>{{ movie.title }}</b></a> ({{movie.screenwriter}}), ({{movie.director}})
+    {% if perms.catalog.can_mark_returned %} -
+    <a href="{% url 'movie-update' movie.id %}">Edit</a> -
+    <a href="{% url 'movie-delete' movie.id %}">Delete</a>  {% endif %}
+  </li>
+{% endfor %}
+""")
+
+LEAN_ROWS = Template("""{% load catalog_extras %}
+{% for movie in movie_list %}
+  <li>
+    <a href="{{ movie.id|row_url:'movie-detail' }}"><b>{{ movie.title }}</b></a> ({{movie.screenwriter}}), ({{movie.director}})
+    {% if can_manage %} -
+    <a href="{{ movie.id|row_url:'movie-update' }}">Edit</a> -
+    <a href="{{ movie.id|row_url:'movie-delete' }}">Delete</a>  {% endif %}
+  </li>
+{% endfor %}
+""")
+
+
+class Command(BaseCommand):
+    help = 'Microbenchmark rendering of the movie list page with in-memory rows (no database access).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100)
+        parser.add_argument('--iterations', type=int, default=200)
+
+    def handle(self, *args, **options):
+        director = Director(id=1, first_name='Michael', last_name='Cash')
+        screenwriter = Screenwriter(id=1, first_name='John', last_name='Smith')
+        movies = [
+            Movie(id=n, title=f'Movie {n}', summary='-', year_of_production='2004',
+                  director=director, screenwriter=screenwriter)
+            for n in range(1, options['rows'] + 1)
+        ]
+
+        user = User(id=1, username='staff', is_staff=True, is_active=True)
+        user._perm_cache = {'catalog.can_mark_returned'}
+        request = RequestFactory().get('/catalog/movies/')
+        request.user = user
+
+        context = {'movie_list': movies, 'is_paginated': False}
+        cases = [
+            ('rows, per-row reverse/perms', lambda: BASELINE_ROWS.render(RequestContext(request, context))),
+            ('rows, precomputed urls', lambda: LEAN_ROWS.render(RequestContext(request, context))),
+            ('full movie_list.html page', lambda: render_to_string('catalog/movie_list.html', context, request)),
+        ]
+
+        self.stdout.write(f'{options["rows"]} rows, {options["iterations"]} iterations')
+        self.stdout.write(f'{"case":<32}{"mean ms":>10}{"p50 ms":>10}{"p95 ms":>10}')
+        for name, render in cases:
+            render()
+            timings = []
+            for _ in range(options['iterations']):
+                started = time.perf_counter()
+                render()
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            self.stdout.write(
+                f'{name:<32}{statistics.mean(timings):>10.2f}{statistics.median(timings):>10.2f}'
+                f'{timings[int(len(timings) * 0.95)]:>10.2f}'
+            )
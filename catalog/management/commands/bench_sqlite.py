@@ -0,0 +1,135 @@
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, transaction
+
+from catalog.models import Movie, MovieInstance
+
+PROFILES = ('default', 'tuned')
+
+
+class Command(BaseCommand):
+    help = ('Compare the plain and tuned SQLite profiles with concurrent reader and writer processes '
+            'on a copy of the database. Run generate_catalog first.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds per profile.')
+        parser.add_argument('--readers', type=int, default=4, help='Processes browsing the catalog.')
+        parser.add_argument('--writers', type=int, default=2, help='Processes lending and returning copies.')
+        parser.add_argument('--profile', action='append', choices=PROFILES, help='Only run these profiles.')
+        # Internal: run one reader or writer process against DATABASE_URL.
+        parser.add_argument('--worker', choices=('reader', 'writer'), help='Internal.')
+        parser.add_argument('--start-at', type=float, help='Internal.')
+        parser.add_argument('--seed', type=int, default=0, help='Internal.')
+
+    def handle(self, *args, **options):
+        if options['worker']:
+            return self.work(options)
+
+        source = settings.DATABASES['default']
+        if 'sqlite3' not in source['ENGINE']:
+            raise CommandError('The default database is not SQLite.')
+        if not MovieInstance.objects.exists():
+            raise CommandError('The database has no movie copies, run generate_catalog first.')
+        connection.close()
+
+        self.stdout.write(f'{"profile":<10}{"workload":<10}{"ops/s":>10}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"errors":>8}')
+        for profile in options['profile'] or PROFILES:
+            with tempfile.TemporaryDirectory() as directory:
+                path = Path(directory) / 'bench.sqlite3'
+                self.copy_database(source['NAME'], path, profile)
+                results = self.run_profile(profile, path, options)
+            for role in ('reader', 'writer'):
+                samples = [sample for result in results if result['role'] == role for sample in result['latencies']]
+                errors = sum(result['errors'] for result in results if result['role'] == role)
+                if not samples and not errors:
+                    continue
+                samples.sort()
+                workload = 'catalog' if role == 'reader' else 'loans'
+                self.stdout.write(
+                    f'{profile:<10}{workload:<10}{len(samples) / options["duration"]:>10.1f}'
+                    f'{self.percentile(samples, 0.5):>10.2f}{self.percentile(samples, 0.95):>10.2f}'
+                    f'{self.percentile(samples, 0.99):>10.2f}{errors:>8}'
+                )
+
+    @staticmethod
+    def percentile(ordered, fraction):
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+    @staticmethod
+    def copy_database(source, target, profile):
+        with sqlite3.connect(source) as src, sqlite3.connect(target) as dst:
+            src.backup(dst)
+            # The journal mode is stored in the file; the plain profile starts from rollback journaling.
+            dst.execute('PRAGMA journal_mode = %s' % ('WAL' if profile == 'tuned' else 'DELETE'))
+        src.close()
+        dst.close()
+
+    def run_profile(self, profile, path, options):
+        env = {**os.environ, 'DATABASE_URL': f'sqlite:///{path}', 'SQLITE_PROFILE': profile}
+        start_at = time.time() + 3
+        roles = ['reader'] * options['readers'] + ['writer'] * options['writers']
+        processes = [
+            subprocess.Popen(
+                [sys.executable, '-m', 'django', 'bench_sqlite', '--worker', role, '--seed', str(n),
+                 '--start-at', str(start_at), '--duration', str(options['duration'])],
+                env=env, cwd=settings.BASE_DIR, stdout=subprocess.PIPE, text=True,
+            )
+            for n, role in enumerate(roles)
+        ]
+        results = []
+        for process in processes:
+            output, _ = process.communicate()
+            if process.returncode:
+                raise CommandError(f'A benchmark worker exited with status {process.returncode}.')
+            results.append(json.loads(output.strip().splitlines()[-1]))
+        return results
+
+    def work(self, options):
+        rng = random.Random(options['seed'])
+        movie_ids = list(Movie.objects.values_list('id', flat=True))
+        copy_ids = list(MovieInstance.objects.values_list('id', flat=True))
+        operation = self.browse if options['worker'] == 'reader' else self.lend_or_return
+        time.sleep(max(0.0, options['start_at'] - time.time()))
+
+        stop_at = time.monotonic() + options['duration']
+        latencies, errors = [], 0
+        while time.monotonic() < stop_at:
+            started = time.perf_counter()
+            try:
+                operation(rng, movie_ids, copy_ids)
+            except OperationalError as error:
+                # "database is locked" / "database table is locked"; anything else is a real failure.
+                if 'locked' not in str(error):
+                    raise
+                errors += 1
+            else:
+                latencies.append(round((time.perf_counter() - started) * 1000, 3))
+        self.stdout.write(json.dumps({'role': options['worker'], 'latencies': latencies, 'errors': errors}))
+
+    @staticmethod
+    def browse(rng, movie_ids, copy_ids):
+        # A page of the movie list, then one movie with its copies and genres.
+        offset = rng.randrange(0, max(1, len(movie_ids) - 10))
+        list(Movie.objects.select_related('director', 'screenwriter').order_by('title')[offset:offset + 10])
+        movie = Movie.objects.select_related('director', 'screenwriter').get(pk=rng.choice(movie_ids))
+        list(movie.movieinstance_set.select_related('branch'))
+        list(movie.genre.all())
+
+    @staticmethod
+    def lend_or_return(rng, movie_ids, copy_ids):
+        # A checkout or return through save(): the copy, its loan event, the branch
+        # counters and the waitlist all change in one transaction.
+        with transaction.atomic():
+            copy = MovieInstance.objects.get(pk=rng.choice(copy_ids))
+            copy.status = 'a' if copy.status == 'o' else 'o'
+            copy.save()
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from catalog.synthetic import generate, PASSWORD
+
+
+class Command(BaseCommand):
+    help = 'Add a synthetic catalog with skewed popularity for load testing.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movies', type=int, default=1000)
+        parser.add_argument('--directors', type=int, help='Defaults to one per ten movies.')
+        parser.add_argument('--screenwriters', type=int, help='Defaults to one per eight movies.')
+        parser.add_argument('--genres', type=int, default=15)
+        parser.add_argument('--branches', type=int, default=5)
+        parser.add_argument('--copies', type=float, default=3.0, help='Mean copies per movie.')
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--on-loan', type=float, default=0.3, help='Share of copies currently on loan.')
+        parser.add_argument('--history', type=int, default=5000, help='Completed past loans.')
+        parser.add_argument('--prefix', default='loaduser', help='Username prefix of the generated users.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        created = generate(
+            movies=options['movies'], directors=options['directors'], screenwriters=options['screenwriters'],
+            genres=options['genres'], branches=options['branches'], copies=options['copies'],
+            users=options['users'], on_loan=options['on_loan'], history=options['history'],
+            prefix=options['prefix'], seed=options['seed'], batch_size=options['batch_size'],
+        )
+        for name, count in created.items():
+            self.stdout.write(f'{name:<16}{count:>10}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated in {time.perf_counter() - started:.1f}s. '
+            f'Users {options["prefix"]}<n> and {options["prefix"]}staff log in with "{PASSWORD}".'
+        ))
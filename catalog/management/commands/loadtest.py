@@ -0,0 +1,192 @@
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+
+from catalog import urls as catalog_urls
+from catalog.models import Branch, Director, Movie, Screenwriter
+from catalog.synthetic import Skewed
+
+PAGE_SIZE = 10
+
+# Read-only traffic mix over catalog/urls.py: route name -> (weight, who may request it).
+# Forms and state-changing POST routes are not replayed.
+TRAFFIC_MIX = {
+    'index': (10, 'anyone'),
+    'movies': (15, 'anyone'),
+    'movie-detail': (30, 'anyone'),
+    'screenwriters': (4, 'anyone'),
+    'screenwriter-detail': (6, 'anyone'),
+    'directors': (4, 'anyone'),
+    'director-detail': (6, 'anyone'),
+    'branches': (3, 'anyone'),
+    'branch-detail': (6, 'anyone'),
+    'my-borrowed': (8, 'user'),
+    'all-borrowed': (4, 'staff'),
+    'loan-analytics': (2, 'staff'),
+}
+DETAIL_MODELS = {
+    'movie-detail': Movie,
+    'screenwriter-detail': Screenwriter,
+    'director-detail': Director,
+    'branch-detail': Branch,
+}
+LIST_MODELS = {
+    'movies': Movie,
+    'screenwriters': Screenwriter,
+    'directors': Director,
+}
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+class Command(BaseCommand):
+    help = 'Replay a read-only traffic mix over the catalog routes and report latency and queries per route.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds to run.')
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument('--requests', type=int, help='Stop each thread after this many requests.')
+        parser.add_argument('--login-share', type=float, default=0.3,
+                            help='Share of public requests made by a logged in user.')
+        parser.add_argument('--route', action='append', choices=sorted(TRAFFIC_MIX), help='Only replay these routes.')
+        parser.add_argument('--prefix', default='loaduser', help='Username prefix of generate_catalog users.')
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.prepare(options)
+        logging.getLogger('django.request').setLevel(logging.ERROR)
+
+        stop_at = time.monotonic() + options['duration']
+        self.results = defaultdict(list)
+        self.errors = defaultdict(list)
+        started = time.perf_counter()
+        threads = [threading.Thread(target=self.run_thread, args=(n, stop_at, options['requests']))
+                   for n in range(options['threads'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.report(time.perf_counter() - started)
+
+    def prepare(self, options):
+        self.host = options['host']
+        self.seed = options['seed']
+        self.login_share = options['login_share']
+        self.users = list(User.objects.filter(username__startswith=options['prefix'], is_staff=False)
+                          .values_list('pk', flat=True))
+        self.staff = User.objects.filter(username=f'{options["prefix"]}staff').first()
+
+        available = {pattern.name for pattern in catalog_urls.urlpatterns}
+        routes = {name: mix for name, mix in TRAFFIC_MIX.items()
+                  if name in available and (not options['route'] or name in options['route'])}
+        if not self.users:
+            routes = {name: mix for name, mix in routes.items() if mix[1] != 'user'}
+        if self.staff is None:
+            routes = {name: mix for name, mix in routes.items() if mix[1] != 'staff'}
+        self.ids = {name: list(model.objects.order_by('pk').values_list('pk', flat=True))
+                    for name, model in DETAIL_MODELS.items() if name in routes}
+        routes = {name: mix for name, mix in routes.items() if name not in self.ids or self.ids[name]}
+        if not routes:
+            raise CommandError('No route to replay, run generate_catalog first.')
+        self.routes = routes
+        self.pages = {name: max(1, -(-model.objects.count() // PAGE_SIZE))
+                      for name, model in LIST_MODELS.items() if name in routes}
+
+        skipped = sorted(available - set(routes))
+        self.stdout.write(f'Replaying {", ".join(routes)}; not replayed: {", ".join(skipped)}')
+
+    def clients(self, rng):
+        anonymous = Client(HTTP_HOST=self.host)
+        user = staff = None
+        if self.users:
+            user = Client(HTTP_HOST=self.host)
+            user.force_login(User.objects.get(pk=rng.choice(self.users)))
+        if self.staff is not None:
+            staff = Client(HTTP_HOST=self.host)
+            staff.force_login(self.staff)
+        return {'anyone': anonymous, 'user': user, 'staff': staff}
+
+    def run_thread(self, worker, stop_at, max_requests):
+        try:
+            self.drive(worker, stop_at, max_requests)
+        finally:
+            connection.close()
+
+    def drive(self, worker, stop_at, max_requests=None):
+        rng = random.Random(self.seed * 1000 + worker)
+        clients = self.clients(rng)
+        names = list(self.routes)
+        weights = [self.routes[name][0] for name in names]
+        # The same items are popular in every thread, as in real traffic.
+        popular = {name: Skewed(random.Random(self.seed), ids) for name, ids in self.ids.items()}
+        pages = {name: Skewed(random.Random(self.seed), range(1, count + 1)) for name, count in self.pages.items()}
+        sent = 0
+        while time.monotonic() < stop_at and (max_requests is None or sent < max_requests):
+            name = rng.choices(names, weights)[0]
+            who = self.routes[name][1]
+            if who == 'anyone' and clients['user'] is not None and rng.random() < self.login_share:
+                who = 'user'
+            url = reverse(name, args=[popular[name].one()]) if name in popular else reverse(name)
+            if name in pages:
+                url += f'?page={pages[name].one()}'
+            self.request(clients[who], name, url)
+            sent += 1
+
+    def request(self, client, name, url):
+        queries = QueryCounter()
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(queries):
+                response = client.get(url)
+        except Exception as error:
+            self.errors[name].append(error)
+            return
+        latency = time.perf_counter() - started
+        if response.status_code >= 400:
+            self.errors[name].append(response.status_code)
+        self.results[name].append((latency, queries.count, queries.duration))
+
+    def report(self, elapsed):
+        self.stdout.write(
+            f'{"route":<22}{"requests":>10}{"req/s":>9}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}'
+            f'{"errors":>8}{"queries":>10}{"q/req":>8}{"db ms/req":>11}'
+        )
+        rows = [(name, self.results[name]) for name in self.routes]
+        rows.append(('total', [sample for _, samples in rows for sample in samples]))
+        for name, samples in rows:
+            latencies = sorted(latency for latency, _, _ in samples)
+            queries = sum(count for _, count, _ in samples)
+            db_time = sum(duration for _, _, duration in samples)
+            errors = sum(map(len, self.errors.values())) if name == 'total' else len(self.errors[name])
+            requests = len(samples) or 1
+            self.stdout.write(
+                f'{name:<22}{len(samples):>10}{len(samples) / elapsed:>9.1f}'
+                f'{percentile(latencies, 0.5) * 1000:>9.1f}{percentile(latencies, 0.95) * 1000:>9.1f}'
+                f'{percentile(latencies, 0.99) * 1000:>9.1f}{errors:>8}{queries:>10}'
+                f'{queries / requests:>8.1f}{db_time * 1000 / requests:>11.2f}'
+            )
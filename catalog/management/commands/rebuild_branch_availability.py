@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from catalog.branches import rebuild_availability
+
+
+class Command(BaseCommand):
+    help = 'Recount the per-branch availability counters from the movie copies.'
+
+    def handle(self, *args, **options):
+        counters = rebuild_availability()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {counters} branch availability counters.'))
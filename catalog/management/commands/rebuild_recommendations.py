@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from catalog.recommendations import (
+    DEFAULT_TOP_K, DEFAULT_MAX_FEATURE_MOVIES, rebuild_recommendations, rebuild_stale_recommendations,
+)
+
+
+class Command(BaseCommand):
+    help = ('Recompute the precomputed "similar movies" neighbour table. Without options only movies '
+            'changed since the last run and those sharing a feature with them are rebuilt; run it periodically.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Rebuild neighbours of every movie.')
+        parser.add_argument('--movie', type=int, action='append', dest='movies', help='Rebuild neighbours of this movie id.')
+        parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K)
+        parser.add_argument('--max-feature-movies', type=int, default=DEFAULT_MAX_FEATURE_MOVIES)
+
+    def handle(self, *args, **options):
+        settings = {'top_k': options['top_k'], 'max_feature_movies': options['max_feature_movies']}
+        if options['full']:
+            rebuilt = rebuild_recommendations(**settings)
+        elif options['movies']:
+            rebuilt = rebuild_recommendations(options['movies'], **settings)
+        else:
+            rebuilt = rebuild_stale_recommendations(**settings)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt neighbours of {rebuilt} movies.'))
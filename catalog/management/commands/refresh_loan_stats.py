@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from catalog.loans import refresh_loan_stats
+
+
+class Command(BaseCommand):
+    help = 'Fold new loan events into the loan statistics rollup tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        processed = refresh_loan_stats(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} loan events.'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from catalog.archive import restore, BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Bring archived movie copies back into circulation, in maintenance, with their loan events.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('copies', nargs='*', help='Ids of the copies to restore; all archived copies by default.')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        restored = restore(options['copies'] or None, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Restored {restored} copies.'))
@@ -0,0 +1,42 @@
+import multiprocessing
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from catalog import jobs
+
+
+def _worker_main(burst, poll_interval):
+    import django
+    django.setup()
+    jobs.work(burst=burst, poll_interval=poll_interval)
+
+
+class Command(BaseCommand):
+    help = 'Run background job workers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1)
+        parser.add_argument('--poll-interval', type=float, default=1.0)
+        parser.add_argument('--burst', action='store_true', help='Exit once no job is ready.')
+
+    def handle(self, *args, **options):
+        purged = jobs.purge_finished()
+        if purged:
+            self.stdout.write(f'Purged {purged} finished jobs.')
+
+        if options['processes'] == 1:
+            processed = jobs.work(burst=options['burst'], poll_interval=options['poll_interval'])
+            self.stdout.write(self.style.SUCCESS(f'Processed {processed} jobs.'))
+            return
+
+        # Children must not share the parent's database connections.
+        connections.close_all()
+        workers = [
+            multiprocessing.Process(target=_worker_main, args=(options['burst'], options['poll_interval']))
+            for _ in range(options['processes'])
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
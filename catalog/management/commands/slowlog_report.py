@@ -0,0 +1,84 @@
+import json
+from collections import Counter, defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.slowlog import slow_query_log_settings
+
+ORDERINGS = {
+    'total': lambda entry: sum(entry['durations']),
+    'max': lambda entry: max(entry['durations']),
+    'count': lambda entry: len(entry['durations']),
+    'p95': lambda entry: percentile(sorted(entry['durations']), 0.95),
+}
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+class Command(BaseCommand):
+    help = 'Summarize the slow-query log into the top query fingerprints, with their views, origins and plans.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help="Log file, SLOW_QUERY_LOG['PATH'] by default.")
+        parser.add_argument('--top', type=int, default=10)
+        parser.add_argument('--order-by', choices=sorted(ORDERINGS), default='total')
+        parser.add_argument('--view', help='Only queries run by this URL name.')
+
+    def handle(self, *args, **options):
+        path = options['path'] or slow_query_log_settings()['PATH']
+        if not path:
+            raise CommandError('No log file given and SLOW_QUERY_LOG is not set.')
+        try:
+            entries, skipped = self.aggregate(path, options['view'])
+        except FileNotFoundError:
+            raise CommandError(f'{path} does not exist.')
+        if skipped:
+            self.stderr.write(f'Skipped {skipped} unreadable lines.')
+        if not entries:
+            self.stdout.write('No slow queries logged.')
+            return
+
+        ranked = sorted(entries.items(), key=lambda item: ORDERINGS[options['order_by']](item[1]), reverse=True)
+        self.stdout.write(f'{"#":>3}  {"fingerprint":<14}{"count":>8}{"total ms":>12}{"mean ms":>10}'
+                          f'{"p95 ms":>10}{"max ms":>10}  views')
+        for rank, (key, entry) in enumerate(ranked[:options['top']], 1):
+            durations = sorted(entry['durations'])
+            views = ', '.join(f'{view} ({count})' for view, count in entry['views'].most_common(3))
+            self.stdout.write(
+                f'{rank:>3}  {key:<14}{len(durations):>8}{sum(durations):>12.1f}'
+                f'{sum(durations) / len(durations):>10.1f}{percentile(durations, 0.95):>10.1f}'
+                f'{durations[-1]:>10.1f}  {views}'
+            )
+        for rank, (key, entry) in enumerate(ranked[:options['top']], 1):
+            self.stdout.write(f'\n{rank}. {key}\n   {entry["sql"]}')
+            for origin, count in entry['origins'].most_common(3):
+                self.stdout.write(f'   from {origin} ({count})')
+            if entry['explain']:
+                self.stdout.write('   plan:')
+                for line in entry['explain'].splitlines():
+                    self.stdout.write(f'     {line}')
+
+    @staticmethod
+    def aggregate(path, view=None):
+        entries = defaultdict(lambda: {'durations': [], 'views': Counter(), 'origins': Counter(),
+                                       'sql': '', 'explain': None})
+        skipped = 0
+        with open(path, encoding='utf-8') as log:
+            for line in log:
+                try:
+                    record = json.loads(line)
+                    key, duration = record['fingerprint'], float(record['duration_ms'])
+                except (ValueError, KeyError, TypeError):
+                    skipped += 1
+                    continue
+                if view and record.get('view') != view:
+                    continue
+                entry = entries[key]
+                entry['durations'].append(duration)
+                entry['views'][record.get('view') or '-'] += 1
+                entry['origins'][record.get('origin') or 'outside catalog/'] += 1
+                entry['sql'] = record.get('sql', entry['sql'])
+                entry['explain'] = record.get('explain') or entry['explain']
+        return entries, skipped
@@ -0,0 +1,83 @@
+# Generated by Django 3.2.12 on 2026-10-19 17:14
+
+import datetime
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('catalog', '0004_alter_movieinstance_options'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Checkpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('position', models.BigIntegerField(default=0)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MovieLoanStats',
+            fields=[
+                ('movie', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='loan_stats', serialize=False, to='catalog.movie')),
+                ('loan_count', models.PositiveIntegerField(db_index=True, default=0)),
+                ('returned_count', models.PositiveIntegerField(default=0)),
+                ('total_loan_time', models.DurationField(default=datetime.timedelta)),
+            ],
+            options={
+                'ordering': ['-loan_count'],
+            },
+        ),
+        migrations.CreateModel(
+            name='UserLoanStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='loan_stats', serialize=False, to='auth.user')),
+                ('loan_count', models.PositiveIntegerField(db_index=True, default=0)),
+                ('returned_count', models.PositiveIntegerField(default=0)),
+                ('total_loan_time', models.DurationField(default=datetime.timedelta)),
+            ],
+            options={
+                'ordering': ['-loan_count'],
+            },
+        ),
+        migrations.CreateModel(
+            name='LoanEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_status', models.CharField(blank=True, choices=[('m', 'Maintenance'), ('o', 'On loan'), ('a', 'Available'), ('r', 'Reserved')], max_length=1)),
+                ('to_status', models.CharField(blank=True, choices=[('m', 'Maintenance'), ('o', 'On loan'), ('a', 'Available'), ('r', 'Reserved')], max_length=1)),
+                ('due_back', models.DateField(blank=True, null=True)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('borrower', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('instance', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='loan_events', to='catalog.movieinstance')),
+                ('movie', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='catalog.movie')),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='InstanceLoanStats',
+            fields=[
+                ('instance', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='loan_stats', serialize=False, to='catalog.movieinstance')),
+                ('loan_count', models.PositiveIntegerField(default=0)),
+                ('total_loan_time', models.DurationField(default=datetime.timedelta)),
+                ('tracked_since', models.DateTimeField()),
+                ('loan_started', models.DateTimeField(blank=True, null=True)),
+                ('borrower', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('movie', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='catalog.movie')),
+            ],
+            options={
+                'ordering': ['-total_loan_time'],
+            },
+        ),
+    ]
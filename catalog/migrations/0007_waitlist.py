@@ -0,0 +1,49 @@
+# Generated by Django 3.2.12 on 2026-10-19 17:17
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('catalog', '0006_movie_neighbours'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WaitlistQueue',
+            fields=[
+                ('movie', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='waitlist', serialize=False, to='catalog.movie')),
+                ('issued', models.PositiveIntegerField(default=0)),
+                ('served', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Reservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ticket', models.PositiveIntegerField()),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('assigned', models.DateTimeField(blank=True, null=True)),
+                ('cancelled', models.DateTimeField(blank=True, null=True)),
+                ('instance', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='catalog.movieinstance')),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='catalog.movie')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['movie', 'ticket'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['user', 'movie'], name='catalog_res_user_id_4f2508_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='reservation',
+            unique_together={('movie', 'ticket')},
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 3.2.12 on 2026-10-19 17:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0008_job_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Branch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('city', models.CharField(db_index=True, max_length=100)),
+                ('address', models.CharField(blank=True, max_length=200)),
+            ],
+            options={
+                'ordering': ['city', 'name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='BranchAvailability',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('copies', models.PositiveIntegerField(default=0)),
+                ('available', models.PositiveIntegerField(default=0)),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='availability', to='catalog.branch')),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='branch_availability', to='catalog.movie')),
+            ],
+            options={
+                'ordering': ['branch', 'movie'],
+            },
+        ),
+        migrations.AddField(
+            model_name='movieinstance',
+            name='branch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='catalog.branch'),
+        ),
+        migrations.AddIndex(
+            model_name='branchavailability',
+            index=models.Index(fields=['movie', 'available'], name='catalog_bra_movie_i_d4a303_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='branchavailability',
+            unique_together={('branch', 'movie')},
+        ),
+    ]
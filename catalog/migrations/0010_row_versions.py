@@ -0,0 +1,33 @@
+# Generated by Django 3.2.12 on 2026-10-19 17:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0009_branches'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='director',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='movieinstance',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='screenwriter',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 3.2.12 on 2026-10-19 17:45
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('catalog', '0010_row_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movieinstance',
+            name='retired_on',
+            field=models.DateField(blank=True, db_index=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='ArchivedMovieInstance',
+            fields=[
+                ('id', models.UUIDField(primary_key=True, serialize=False)),
+                ('production', models.CharField(max_length=200)),
+                ('due_back', models.DateField(blank=True, null=True)),
+                ('status', models.CharField(blank=True, choices=[('m', 'Maintenance'), ('o', 'On loan'), ('a', 'Available'), ('r', 'Reserved')], max_length=1)),
+                ('version', models.PositiveIntegerField(default=1)),
+                ('retired_on', models.DateField(blank=True, null=True)),
+                ('archived', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('borrower', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('branch', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='catalog.branch')),
+                ('movie', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='catalog.movie')),
+            ],
+            options={
+                'ordering': ['archived', 'id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedLoanEvent',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('from_status', models.CharField(blank=True, choices=[('m', 'Maintenance'), ('o', 'On loan'), ('a', 'Available'), ('r', 'Reserved')], max_length=1)),
+                ('to_status', models.CharField(blank=True, choices=[('m', 'Maintenance'), ('o', 'On loan'), ('a', 'Available'), ('r', 'Reserved')], max_length=1)),
+                ('due_back', models.DateField(blank=True, null=True)),
+                ('created', models.DateTimeField()),
+                ('borrower', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('instance', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='loan_events', to='catalog.archivedmovieinstance')),
+                ('movie', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='catalog.movie')),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 3.2.12 on 2026-10-19 18:40
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0012_stale_recommendations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='loanevent',
+            name='recorded',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
@@ -1,8 +1,84 @@
-from django.db import models
+from django.db import models, router, transaction
 from django.urls import reverse
 import uuid
 from django.contrib.auth.models import User
-from datetime import date
+from django.utils import timezone
+from datetime import date, timedelta
+
+class ConcurrentUpdateError(Exception):
+    """The row was changed by someone else after this copy of it was loaded."""
+
+class VersionedModel(models.Model):
+    """
+    Optimistic concurrency: every update is an UPDATE ... WHERE version = <loaded version>
+    that bumps the version, and only the columns changed since loading are written.
+    """
+    version = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using, list(fields) if fields is not None else None)
+        # The reloaded columns are the new "before" state for changed_fields() and the signals.
+        deferred = self.get_deferred_fields()
+        reloaded = [field.attname for field in self._meta.concrete_fields
+                    if (field.attname in fields if fields is not None else field.attname not in deferred)]
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            loaded = self._loaded_values = {}
+        loaded.update((attname, getattr(self, attname)) for attname in reloaded)
+
+    def changed_fields(self):
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return None
+        return [
+            field.attname for field in self._meta.concrete_fields
+            if not field.primary_key and field.attname != 'version'
+            # A deferred field that has been set since loading is written as well.
+            and (getattr(self, field.attname) != loaded[field.attname] if field.attname in loaded
+                 else field.attname in self.__dict__)
+        ]
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            super().save(*args, **kwargs)
+        else:
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None:
+                update_fields = self.changed_fields()
+            if update_fields is not None:
+                if not update_fields:
+                    return
+                kwargs['update_fields'] = {*update_fields, 'version'}
+            self._expected_version = expected = self.version
+            self.version = expected + 1
+            try:
+                # A savepoint keeps an enclosing transaction usable after a conflict.
+                with transaction.atomic(using=kwargs.get('using') or router.db_for_write(type(self), instance=self)):
+                    super().save(*args, **kwargs)
+            except BaseException:
+                self.version = expected
+                raise
+            finally:
+                del self._expected_version
+        self._loaded_values = {field.attname: getattr(self, field.attname) for field in self._meta.concrete_fields}
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        expected = getattr(self, '_expected_version', None)
+        if expected is None:
+            return super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update)
+        updated = super()._do_update(base_qs.filter(version=expected), using, pk_val, values, update_fields, forced_update)
+        if not updated and base_qs.filter(pk=pk_val).exists():
+            raise ConcurrentUpdateError(f'{self._meta.verbose_name} {pk_val} is no longer at version {expected}.')
+        return updated
 
 class Genre(models.Model):
     name = models.CharField(max_length=200, help_text='Enter a movie genre')
@@ -10,7 +86,7 @@ class Genre(models.Model):
     def __str__(self):
         return self.name
 
-class Movie(models.Model):
+class Movie(VersionedModel):
     title = models.CharField(max_length=200)
 
     screenwriter = models.ForeignKey('Screenwriter', on_delete=models.SET_NULL, null=True)
@@ -33,12 +109,75 @@ class Movie(models.Model):
     def get_absolute_url(self):
         return reverse('movie-detail', args=[str(self.id)])
 
-class MovieInstance(models.Model):
+class Branch(models.Model):
+    name = models.CharField(max_length=200)
+    city = models.CharField(max_length=100, db_index=True)
+    address = models.CharField(max_length=200, blank=True)
+
+    class Meta:
+        ordering = ['city', 'name']
+
+    def get_absolute_url(self):
+        return reverse('branch-detail', args=[str(self.id)])
+
+    def __str__(self):
+        return f'{self.name} ({self.city})'
+
+class BranchAvailability(models.Model):
+    branch = models.ForeignKey('Branch', on_delete=models.CASCADE, related_name='availability')
+    movie = models.ForeignKey('Movie', on_delete=models.CASCADE, related_name='branch_availability')
+    copies = models.PositiveIntegerField(default=0)
+    available = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['branch', 'movie']
+        unique_together = [['branch', 'movie']]
+        indexes = [models.Index(fields=['movie', 'available'])]
+
+    def __str__(self):
+        return f'{self.branch_id}/{self.movie_id}: {self.available}/{self.copies}'
+
+class MovieNeighbour(models.Model):
+    movie = models.ForeignKey('Movie', on_delete=models.CASCADE, related_name='neighbours')
+    neighbour = models.ForeignKey('Movie', on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        ordering = ['movie', 'rank']
+        unique_together = [['movie', 'rank']]
+
+    def __str__(self):
+        return f'{self.movie_id} -> {self.neighbour_id} ({self.score:.3f})'
+
+class StaleRecommendation(models.Model):
+    """A movie whose features changed since its neighbours were last computed."""
+    movie = models.ForeignKey('Movie', on_delete=models.CASCADE, related_name='+')
+    created = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f'{self.movie_id} ({self.created})'
+
+class ActiveInstanceManager(models.Manager):
+    def get_queryset(self):
+        return super().get_queryset().filter(retired_on__isnull=True)
+
+class MovieInstance(VersionedModel):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, help_text='Unique ID for this particular movie across whole movie rental')
     movie = models.ForeignKey('Movie', on_delete=models.RESTRICT, null=True)
     production = models.CharField(max_length=200)
+    branch = models.ForeignKey('Branch', on_delete=models.SET_NULL, null=True, blank=True)
     due_back = models.DateField(null=True, blank=True)
     borrower = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    retired_on = models.DateField(null=True, blank=True, db_index=True)
+
+    # Retired copies are out of circulation; the first manager is also the one
+    # related managers such as movie.movieinstance_set are built from.
+    objects = ActiveInstanceManager()
+    all_objects = models.Manager()
 
     @property
     def is_overdue(self):
@@ -68,7 +207,154 @@ class MovieInstance(models.Model):
     def __str__(self):
         return f'{self.id}, {self.movie.title}, {self.status}, {self.due_back}'
 
-class Screenwriter(models.Model):
+class LoanEvent(models.Model):
+    instance = models.ForeignKey('MovieInstance', on_delete=models.DO_NOTHING, db_constraint=False, related_name='loan_events')
+    movie = models.ForeignKey('Movie', on_delete=models.SET_NULL, null=True)
+    borrower = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    from_status = models.CharField(max_length=1, choices=MovieInstance.LOAN_STATUS, blank=True)
+    to_status = models.CharField(max_length=1, choices=MovieInstance.LOAN_STATUS, blank=True)
+    due_back = models.DateField(null=True, blank=True)
+    created = models.DateTimeField(default=timezone.now)
+    # Set by the INSERT itself rather than when the event was built, see refresh_loan_stats.
+    recorded = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+
+    @property
+    def starts_loan(self):
+        return self.to_status == 'o' and self.from_status != 'o'
+
+    @property
+    def ends_loan(self):
+        return self.from_status == 'o' and self.to_status != 'o'
+
+    def __str__(self):
+        return f'{self.instance_id}: {self.from_status or "-"} -> {self.to_status} ({self.created})'
+
+class ArchivedMovieInstance(models.Model):
+    """A retired copy moved out of MovieInstance, with the same columns and id."""
+    id = models.UUIDField(primary_key=True)
+    movie = models.ForeignKey('Movie', on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='+')
+    production = models.CharField(max_length=200)
+    branch = models.ForeignKey('Branch', on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='+')
+    due_back = models.DateField(null=True, blank=True)
+    borrower = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='+')
+    status = models.CharField(max_length=1, choices=MovieInstance.LOAN_STATUS, blank=True)
+    version = models.PositiveIntegerField(default=1)
+    retired_on = models.DateField(null=True, blank=True)
+    archived = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        ordering = ['archived', 'id']
+
+    def __str__(self):
+        return f'{self.id} (archived {self.archived:%Y-%m-%d})'
+
+class ArchivedLoanEvent(models.Model):
+    """A LoanEvent of an archived copy, keeping its original id."""
+    id = models.BigIntegerField(primary_key=True)
+    instance = models.ForeignKey('ArchivedMovieInstance', on_delete=models.CASCADE, related_name='loan_events')
+    movie = models.ForeignKey('Movie', on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='+')
+    borrower = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='+')
+    from_status = models.CharField(max_length=1, choices=MovieInstance.LOAN_STATUS, blank=True)
+    to_status = models.CharField(max_length=1, choices=MovieInstance.LOAN_STATUS, blank=True)
+    due_back = models.DateField(null=True, blank=True)
+    created = models.DateTimeField()
+
+    class Meta:
+        ordering = ['id']
+
+class MovieLoanStats(models.Model):
+    movie = models.OneToOneField('Movie', on_delete=models.CASCADE, primary_key=True, related_name='loan_stats')
+    loan_count = models.PositiveIntegerField(default=0, db_index=True)
+    returned_count = models.PositiveIntegerField(default=0)
+    total_loan_time = models.DurationField(default=timedelta)
+
+    class Meta:
+        ordering = ['-loan_count']
+
+    @property
+    def average_loan_time(self):
+        if not self.returned_count:
+            return None
+        return self.total_loan_time / self.returned_count
+
+class UserLoanStats(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='loan_stats')
+    loan_count = models.PositiveIntegerField(default=0, db_index=True)
+    returned_count = models.PositiveIntegerField(default=0)
+    total_loan_time = models.DurationField(default=timedelta)
+
+    class Meta:
+        ordering = ['-loan_count']
+
+    @property
+    def average_loan_time(self):
+        if not self.returned_count:
+            return None
+        return self.total_loan_time / self.returned_count
+
+class InstanceLoanStats(models.Model):
+    instance = models.OneToOneField('MovieInstance', on_delete=models.DO_NOTHING, db_constraint=False, primary_key=True, related_name='loan_stats')
+    movie = models.ForeignKey('Movie', on_delete=models.SET_NULL, null=True)
+    borrower = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    loan_count = models.PositiveIntegerField(default=0)
+    total_loan_time = models.DurationField(default=timedelta)
+    tracked_since = models.DateTimeField()
+    loan_started = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-total_loan_time']
+
+    def utilization(self, now=None):
+        now = now or timezone.now()
+        in_service = now - self.tracked_since
+        if in_service <= timedelta():
+            return 0.0
+        on_loan = self.total_loan_time
+        if self.loan_started:
+            on_loan += now - self.loan_started
+        return min(on_loan / in_service, 1.0)
+
+class Checkpoint(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+    position = models.BigIntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.name}: {self.position}'
+
+class WaitlistQueue(models.Model):
+    movie = models.OneToOneField('Movie', on_delete=models.CASCADE, primary_key=True, related_name='waitlist')
+    issued = models.PositiveIntegerField(default=0)
+    served = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.movie_id}: {self.served}/{self.issued}'
+
+class Reservation(models.Model):
+    movie = models.ForeignKey('Movie', on_delete=models.CASCADE, related_name='reservations')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reservations')
+    ticket = models.PositiveIntegerField()
+    instance = models.ForeignKey('MovieInstance', on_delete=models.SET_NULL, null=True, blank=True)
+    created = models.DateTimeField(default=timezone.now)
+    assigned = models.DateTimeField(null=True, blank=True)
+    cancelled = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['movie', 'ticket']
+        unique_together = [['movie', 'ticket']]
+        indexes = [models.Index(fields=['user', 'movie'])]
+
+    @property
+    def is_waiting(self):
+        return self.assigned is None and self.cancelled is None
+
+    def __str__(self):
+        return f'{self.movie_id} #{self.ticket}: {self.user_id}'
+
+class Screenwriter(VersionedModel):
     first_name = models.CharField(max_length=100)
     last_name = models.CharField(max_length=100)
     date_of_birth = models.DateField(null=True, blank=True)
@@ -83,7 +369,7 @@ class Screenwriter(models.Model):
     def __str__(self):
         return f'{self.last_name}, {self.first_name}'
 
-class Director(models.Model):
+class Director(VersionedModel):
     first_name = models.CharField(max_length=100)
     last_name = models.CharField(max_length=100)
     date_of_birth = models.DateField(null=True, blank=True)
@@ -97,3 +383,39 @@ class Director(models.Model):
 
     def __str__(self):
         return f'{self.last_name}, {self.first_name}'
+
+class ThrottleCounter(models.Model):
+    """Failed attempts of one identity in one fixed window, incremented in place."""
+    key = models.CharField(max_length=100, unique=True)
+    count = models.PositiveIntegerField(default=0)
+    expires = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f'{self.key}: {self.count}'
+
+class Job(models.Model):
+    JOB_STATUS = (
+        ('q', 'Queued'),
+        ('r', 'Running'),
+        ('d', 'Done'),
+        ('f', 'Failed'),
+    )
+
+    task = models.CharField(max_length=200)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=1, choices=JOB_STATUS, default='q')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=200, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(default=timezone.now)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['run_after', 'id']
+        indexes = [models.Index(fields=['status', 'run_after'])]
+
+    def __str__(self):
+        return f'{self.task} ({self.get_status_display()})'
@@ -0,0 +1,158 @@
+import numpy as np
+from scipy import sparse
+
+from django.db import transaction
+
+from .models import Movie, MovieNeighbour, LoanEvent, Checkpoint, StaleRecommendation
+
+LOANS_CHECKPOINT = 'recommendations-loans'
+MOVIES_CHECKPOINT = 'recommendations-movies'
+
+DEFAULT_TOP_K = 10
+# Relative weight of every similarity signal in the final score.
+DEFAULT_WEIGHTS = {
+    'genre': 1.0,
+    'director': 1.0,
+    'screenwriter': 0.75,
+    'borrower': 1.5,
+}
+# Features shared by more movies than this say little about similarity and would
+# make the product matrix dense, so they are left out (like max_df in TF-IDF).
+DEFAULT_MAX_FEATURE_MOVIES = 5000
+# Upper bound of non-zero scores materialised per chunk of rows.
+DEFAULT_CHUNK_BUDGET = 5_000_000
+MAX_CHUNK_ROWS = 500
+# Stale markers are deleted in batches small enough for any backend's parameter limit.
+MARKER_BATCH_SIZE = 500
+
+
+def incidence_matrix(pairs, movie_ids, max_feature_movies=DEFAULT_MAX_FEATURE_MOVIES):
+    pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+    pairs = pairs[np.isin(pairs[:, 0], movie_ids)]
+    rows = np.searchsorted(movie_ids, pairs[:, 0])
+    _, cols = np.unique(pairs[:, 1], return_inverse=True)
+    shape = (len(movie_ids), int(cols.max()) + 1 if len(cols) else 0)
+    matrix = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=shape)
+    matrix.data[:] = 1.0
+
+    movies_per_feature = np.diff(matrix.tocsc().indptr)
+    keep = np.flatnonzero((movies_per_feature > 1) & (movies_per_feature <= max_feature_movies))
+    return matrix[:, keep]
+
+
+def feature_matrix(blocks, weights):
+    total = sum(weights[name] for name in blocks)
+    scaled = []
+    for name, block in blocks.items():
+        norms = np.sqrt(np.asarray(block.multiply(block).sum(axis=1)).ravel())
+        inverse = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+        scaled.append(sparse.diags(inverse * np.sqrt(weights[name] / total)) @ block)
+    return sparse.hstack(scaled, format='csr')
+
+
+def _chunks(matrix, rows, budget):
+    binary = matrix.copy()
+    binary.data[:] = 1.0
+    movies_per_feature = np.diff(matrix.tocsc().indptr)
+    cost = (binary[rows] @ movies_per_feature).astype(np.int64)
+
+    start = 0
+    while start < len(rows):
+        end = start + 1
+        spent = cost[start]
+        while end < len(rows) and end - start < MAX_CHUNK_ROWS and spent + cost[end] <= budget:
+            spent += cost[end]
+            end += 1
+        yield rows[start:end]
+        start = end
+
+
+def nearest_neighbours(matrix, rows, top_k=DEFAULT_TOP_K, budget=DEFAULT_CHUNK_BUDGET):
+    transposed = matrix.T.tocsr()
+    for chunk in _chunks(matrix, np.asarray(rows, dtype=np.int64), budget):
+        scores = (matrix[chunk] @ transposed).tocoo()
+        keep = (scores.col != chunk[scores.row]) & (scores.data > 0)
+        row, col, data = scores.row[keep], scores.col[keep], scores.data[keep]
+
+        order = np.lexsort((col, -data, row))
+        row, col, data = row[order], col[order], data[order]
+        rank = np.arange(len(row)) - np.searchsorted(row, row)
+        keep = rank < top_k
+        yield chunk, chunk[row[keep]], col[keep], rank[keep], data[keep]
+
+
+def _load_features(movie_ids, max_feature_movies):
+    movies = Movie.objects.order_by()
+    loans = LoanEvent.objects.filter(to_status='o', movie__isnull=False, borrower__isnull=False).order_by()
+    pairs = {
+        'genre': Movie.genre.through.objects.values_list('movie_id', 'genre_id'),
+        'director': movies.filter(director__isnull=False).values_list('id', 'director_id'),
+        'screenwriter': movies.filter(screenwriter__isnull=False).values_list('id', 'screenwriter_id'),
+        'borrower': loans.values_list('movie_id', 'borrower_id').distinct(),
+    }
+    return {
+        name: incidence_matrix(list(queryset.iterator()), movie_ids, max_feature_movies)
+        for name, queryset in pairs.items()
+    }
+
+
+def sharing_features(matrix, rows):
+    """Rows of matrix that have at least one feature in common with the given rows."""
+    features = np.unique(matrix[rows].indices)
+    related = np.unique(matrix.tocsc()[:, features].indices)
+    return np.union1d(rows, related).astype(np.int64)
+
+
+def rebuild_recommendations(movie_ids=None, top_k=DEFAULT_TOP_K, weights=None,
+                            max_feature_movies=DEFAULT_MAX_FEATURE_MOVIES, budget=DEFAULT_CHUNK_BUDGET,
+                            include_related=False):
+    all_ids = np.fromiter(Movie.objects.order_by('id').values_list('id', flat=True).iterator(), dtype=np.int64)
+    if movie_ids is None:
+        rows = np.arange(len(all_ids))
+    else:
+        wanted = np.unique(np.asarray(list(movie_ids), dtype=np.int64))
+        rows = np.searchsorted(all_ids, wanted[np.isin(wanted, all_ids)])
+    if not len(rows):
+        return 0
+
+    matrix = feature_matrix(_load_features(all_ids, max_feature_movies), weights or DEFAULT_WEIGHTS)
+    if include_related and movie_ids is not None:
+        # Similarity is symmetric: every movie sharing a feature with a changed one
+        # may gain it as a neighbour or lose it, so it is recomputed as well.
+        rows = sharing_features(matrix, rows)
+    for chunk, sources, targets, ranks, scores in nearest_neighbours(matrix, rows, top_k, budget):
+        neighbours = [
+            MovieNeighbour(movie_id=all_ids[source], neighbour_id=all_ids[target], rank=rank, score=score)
+            for source, target, rank, score in zip(sources.tolist(), targets.tolist(), ranks.tolist(), scores.tolist())
+        ]
+        with transaction.atomic():
+            MovieNeighbour.objects.filter(movie_id__in=all_ids[chunk].tolist()).delete()
+            MovieNeighbour.objects.bulk_create(neighbours, batch_size=1000)
+    return len(rows)
+
+
+def rebuild_stale_recommendations(**options):
+    loans, _ = Checkpoint.objects.get_or_create(name=LOANS_CHECKPOINT)
+    movies, _ = Checkpoint.objects.get_or_create(name=MOVIES_CHECKPOINT)
+    last_event = LoanEvent.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    last_movie = Movie.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    markers = list(StaleRecommendation.objects.values_list('id', 'movie_id'))
+
+    new_loans = LoanEvent.objects.filter(id__gt=loans.position, id__lte=last_event, to_status='o', movie__isnull=False)
+    stale = set(new_loans.values_list('movie_id', flat=True))
+    # Bulk-created movies bypass the signals that record edits, so new ids are picked up here.
+    stale.update(Movie.objects.filter(id__gt=movies.position, id__lte=last_movie).values_list('id', flat=True))
+    stale.update(movie_id for _, movie_id in markers)
+    if stale:
+        # Movies that list a stale movie as a neighbour may have lost a shared feature with it.
+        stale.update(MovieNeighbour.objects.filter(neighbour_id__in=stale).values_list('movie_id', flat=True))
+
+    rebuilt = rebuild_recommendations(stale, include_related=True, **options) if stale else 0
+    loans.position, movies.position = last_event, last_movie
+    loans.save(update_fields=['position', 'updated'])
+    movies.save(update_fields=['position', 'updated'])
+    # Only the markers read above are consumed; edits made during the rebuild stay queued.
+    marker_ids = [marker_id for marker_id, _ in markers]
+    for start in range(0, len(marker_ids), MARKER_BATCH_SIZE):
+        StaleRecommendation.objects.filter(id__in=marker_ids[start:start + MARKER_BATCH_SIZE]).delete()
+    return rebuilt
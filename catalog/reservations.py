@@ -0,0 +1,115 @@
+import datetime
+
+from django.db import DatabaseError, IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .branches import instance_changed
+from .loans import record_loan_event
+from .models import MovieInstance, Reservation, WaitlistQueue
+
+RESERVATION_HOLD = datetime.timedelta(days=3)
+
+
+def active_reservation(movie, user):
+    return Reservation.objects.filter(movie=movie, user=user, assigned__isnull=True, cancelled__isnull=True).first()
+
+
+def queue_position(reservation):
+    # Tickets are handed out in order, so the distance to the last served ticket is the
+    # position. Cancelled tickets ahead are only skipped when dequeued, which makes this
+    # an upper bound rather than an exact rank.
+    served = WaitlistQueue.objects.values_list('served', flat=True).get(movie_id=reservation.movie_id)
+    return reservation.ticket - served
+
+
+def _ensure_queue(movie_id):
+    try:
+        with transaction.atomic():
+            WaitlistQueue.objects.get_or_create(movie_id=movie_id)
+    except IntegrityError:
+        pass
+
+
+def reserve(movie, user):
+    existing = active_reservation(movie, user)
+    if existing is not None:
+        return existing
+    _ensure_queue(movie.pk)
+    with transaction.atomic():
+        WaitlistQueue.objects.filter(movie_id=movie.pk).update(issued=F('issued') + 1)
+        ticket = WaitlistQueue.objects.values_list('issued', flat=True).get(movie_id=movie.pk)
+        return Reservation.objects.create(movie=movie, user=user, ticket=ticket)
+
+
+def cancel(reservation):
+    cancelled = Reservation.objects.filter(pk=reservation.pk, assigned__isnull=True, cancelled__isnull=True) \
+        .update(cancelled=timezone.now())
+    return bool(cancelled)
+
+
+class _CopyTaken(Exception):
+    pass
+
+
+def assign_next_reservation(instance):
+    # Runs in the post_save of whoever returned the copy. Waitlist contention must not
+    # fail that save: the copy then stays available and the queue is served by a job.
+    try:
+        return serve_waitlist(instance)
+    except DatabaseError:
+        from .tasks import serve_waitlist as serve_waitlist_later
+        serve_waitlist_later.delay(instance_id=str(instance.pk))
+        return None
+
+
+def serve_waitlist(instance):
+    try:
+        with transaction.atomic():
+            return _dequeue(instance)
+    except _CopyTaken:
+        return None
+
+
+def _dequeue(instance):
+    while True:
+        queue = WaitlistQueue.objects.filter(movie_id=instance.movie_id).values('served', 'issued').first()
+        if queue is None or queue['served'] >= queue['issued']:
+            return None
+
+        # Compare-and-swap on the head of the queue: only one caller can advance it
+        # from a given value, the others retry against the new head.
+        ticket = queue['served'] + 1
+        advanced = WaitlistQueue.objects.filter(movie_id=instance.movie_id, served=queue['served']) \
+            .update(served=ticket)
+        if not advanced:
+            continue
+
+        now = timezone.now()
+        reservation = Reservation.objects.filter(movie_id=instance.movie_id, ticket=ticket).first()
+        if reservation is None or not Reservation.objects.filter(pk=reservation.pk, cancelled__isnull=True) \
+                .update(instance=instance, assigned=now):
+            continue
+
+        due_back = now.date() + RESERVATION_HOLD
+        if not MovieInstance.objects.filter(pk=instance.pk, status='a') \
+                .update(status='r', borrower_id=reservation.user_id, due_back=due_back, version=F('version') + 1):
+            raise _CopyTaken()
+        break
+
+    instance_changed((instance.branch_id, instance.movie_id, 'a'), (instance.branch_id, instance.movie_id, 'r'))
+    # The hand-off happens in the copy's own post_save, after its version was bumped.
+    previous = instance.status, instance.borrower_id, instance.due_back, instance.version
+    instance.status, instance.borrower_id, instance.due_back = 'r', reservation.user_id, due_back
+    instance.version += 1
+    try:
+        record_loan_event(instance, 'a', 'r')
+    except BaseException:
+        # The savepoint is rolled back, so the copy in memory has to be as well.
+        instance.status, instance.borrower_id, instance.due_back, instance.version = previous
+        raise
+    if hasattr(instance, '_loaded_values'):
+        instance._loaded_values.update(status='r', borrower_id=reservation.user_id, due_back=due_back,
+                                       version=instance.version)
+    reservation.instance, reservation.assigned = instance, now
+    return reservation
@@ -0,0 +1,200 @@
+from django.contrib.auth.models import Group, User
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
+
+from .backends import invalidate_permissions_on_commit
+from .branches import instance_changed
+from .cache import invalidate_on_commit, borrowed_count_key, INDEX_COUNTS_KEY, MOVIES_FIRST_PAGE_KEY
+from .loans import record_loan_event
+from .models import Movie, MovieInstance, MovieNeighbour, StaleRecommendation, Director, Screenwriter, Genre
+from .reservations import assign_next_reservation
+
+
+def _previous_value(instance, created, attname):
+    if created:
+        return ''
+    loaded = getattr(instance, '_loaded_values', None)
+    if loaded is None or attname not in loaded:
+        return None
+    return loaded[attname]
+
+
+def _availability_state(values):
+    # Retired copies are not counted anywhere.
+    if values.get('retired_on') is not None:
+        return None
+    return values.get('branch_id'), values.get('movie_id'), values.get('status')
+
+
+def _current_state(instance):
+    return _availability_state({attname: getattr(instance, attname)
+                                for attname in ('branch_id', 'movie_id', 'status', 'retired_on')})
+
+
+# Connected before track_status_change: handing a returned copy to the waitlist
+# moves it on from 'a', which has to be counted as available first.
+@receiver(post_save, sender=MovieInstance)
+def track_branch_availability(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        before = None
+    else:
+        loaded = getattr(instance, '_loaded_values', None)
+        if loaded is None or not {'branch_id', 'movie_id', 'status', 'retired_on'} <= loaded.keys():
+            # Deferred fields: the old counters are unknown, rebuild_availability repairs them.
+            return
+        before = _availability_state(loaded)
+    after = _current_state(instance)
+    if before != after:
+        instance_changed(before, after)
+
+
+@receiver(post_delete, sender=MovieInstance)
+def release_branch_availability(sender, instance, **kwargs):
+    loaded = getattr(instance, '_loaded_values', None)
+    instance_changed(_availability_state(loaded) if loaded else _current_state(instance), None)
+
+
+def _invalidate_borrowed_counts(*user_ids):
+    keys = [borrowed_count_key(user_id) for user_id in set(user_ids) - {None}]
+    if keys:
+        invalidate_on_commit(*keys)
+
+
+# Also connected before track_status_change, which may hand the copy on to a new borrower.
+@receiver(post_save, sender=MovieInstance)
+def track_borrowed_counts(sender, instance, created, raw=False, **kwargs):
+    if created:
+        _invalidate_borrowed_counts(instance.borrower_id)
+        return
+    loaded = getattr(instance, '_loaded_values', None) or {}
+    if (loaded.get('borrower_id'), loaded.get('status')) != (instance.borrower_id, instance.status):
+        _invalidate_borrowed_counts(instance.borrower_id, loaded.get('borrower_id'))
+
+
+@receiver(post_delete, sender=MovieInstance)
+def release_borrowed_count(sender, instance, **kwargs):
+    _invalidate_borrowed_counts(instance.borrower_id)
+
+
+@receiver(post_save, sender=MovieInstance)
+def track_status_change(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = _previous_value(instance, created, 'status')
+    if previous is None or previous == instance.status:
+        return
+    record_loan_event(instance, previous, instance.status)
+    if instance.status == 'a' and instance.movie_id is not None:
+        assign_next_reservation(instance)
+
+
+def _mark_recommendations_stale(movie_ids):
+    movie_ids = set(movie_ids) - {None}
+    if movie_ids:
+        StaleRecommendation.objects.bulk_create([StaleRecommendation(movie_id=movie_id) for movie_id in movie_ids])
+
+
+@receiver(post_save, sender=Movie)
+def movie_features_changed(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    loaded = getattr(instance, '_loaded_values', None)
+    if not created and loaded is not None and all(
+            attname in loaded and loaded[attname] == getattr(instance, attname)
+            for attname in ('director_id', 'screenwriter_id')):
+        return
+    _mark_recommendations_stale([instance.pk])
+
+
+@receiver(m2m_changed, sender=Movie.genre.through)
+def movie_genres_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # Cleared from the genre side: the movies are only known beforehand.
+        instance._cleared_movie_ids = list(sender.objects.filter(genre=instance).values_list('movie_id', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        _mark_recommendations_stale([instance.pk])
+    elif action == 'post_clear':
+        _mark_recommendations_stale(instance.__dict__.pop('_cleared_movie_ids', []))
+    else:
+        _mark_recommendations_stale(pk_set)
+
+
+@receiver(pre_delete, sender=Genre)
+def genre_deleted(sender, instance, **kwargs):
+    _mark_recommendations_stale(Movie.genre.through.objects.filter(genre=instance).values_list('movie_id', flat=True))
+
+
+@receiver(pre_delete, sender=Movie)
+def movie_deleted(sender, instance, **kwargs):
+    # Its neighbour rows go with it, leaving the movies that listed it a slot short.
+    _mark_recommendations_stale(MovieNeighbour.objects.filter(neighbour=instance).values_list('movie_id', flat=True))
+
+
+@receiver(post_save, sender=MovieInstance)
+@receiver(post_delete, sender=MovieInstance)
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+def invalidate_index_counts(sender, **kwargs):
+    invalidate_on_commit(INDEX_COUNTS_KEY)
+
+
+@receiver(post_save, sender=Movie)
+@receiver(post_delete, sender=Movie)
+@receiver(post_save, sender=Director)
+@receiver(post_delete, sender=Director)
+@receiver(post_save, sender=Screenwriter)
+@receiver(post_delete, sender=Screenwriter)
+def invalidate_movie_pages(sender, **kwargs):
+    invalidate_on_commit(INDEX_COUNTS_KEY, MOVIES_FIRST_PAGE_KEY)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_permissions(sender, instance, raw=False, **kwargs):
+    # is_active and is_superuser changes alter the permission set as well.
+    if not raw:
+        invalidate_permissions_on_commit([instance.pk])
+
+
+@receiver(pre_delete, sender=Group)
+def invalidate_group_permissions(sender, instance, **kwargs):
+    invalidate_permissions_on_commit(list(instance.user_set.values_list('pk', flat=True)))
+
+
+def _users_in_groups(group_ids):
+    return list(User.objects.filter(groups__in=group_ids).values_list('pk', flat=True).distinct())
+
+
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=User.groups.through)
+def user_permissions_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # Cleared from the permission or group side: the users are only known beforehand,
+        # but the rows are still there until post_clear.
+        related = 'permission' if sender is User.user_permissions.through else 'group'
+        instance._cleared_user_ids = list(sender.objects.filter(**{related: instance}).values_list('user_id', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        invalidate_permissions_on_commit([instance.pk])
+    elif action == 'post_clear':
+        invalidate_permissions_on_commit(instance.__dict__.pop('_cleared_user_ids', []))
+    else:
+        invalidate_permissions_on_commit(pk_set)
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def group_permissions_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        instance._cleared_user_ids = _users_in_groups(sender.objects.filter(permission=instance).values('group_id'))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        invalidate_permissions_on_commit(_users_in_groups([instance.pk]))
+    elif action == 'post_clear':
+        invalidate_permissions_on_commit(instance.__dict__.pop('_cleared_user_ids', []))
+    else:
+        invalidate_permissions_on_commit(_users_in_groups(pk_set))
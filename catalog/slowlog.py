@@ -0,0 +1,191 @@
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+
+DEFAULT_SLOW_QUERY_LOG = {
+    'PATH': '',
+    'THRESHOLD_MS': 100.0,
+    'EXPLAIN_SAMPLES': 20,
+}
+
+CATALOG_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(CATALOG_DIR)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'(?<![\w."])-?\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%s|\?')
+_IN_LIST = re.compile(r'\bIN \(\?(?:, \?)*\)', re.IGNORECASE)
+_ROWS = re.compile(r'(\(\?(?:, \?)*\))(?:, \1)+')
+_WHITESPACE = re.compile(r'\s+')
+
+_write_lock = threading.Lock()
+
+
+def slow_query_log_settings():
+    return {**DEFAULT_SLOW_QUERY_LOG, **getattr(settings, 'SLOW_QUERY_LOG', {})}
+
+
+def normalize(sql):
+    """
+    The shape of a statement: literals and placeholders become ?, IN lists and
+    multi-row VALUES collapse, so pages and batches of one query read the same.
+    """
+    sql = _STRING.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _WHITESPACE.sub(' ', sql).strip()
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _ROWS.sub(r'\1, ...', sql)
+
+
+def fingerprint(sql):
+    return hashlib.sha1(normalize(sql).encode()).hexdigest()[:12]
+
+
+def params_fingerprint(params, many=False):
+    # Values are hashed, not logged: they may hold usernames and other personal data.
+    if params is None:
+        return None
+    if many:
+        params = ('many', len(params)) if isinstance(params, (list, tuple)) else ('many', None)
+    return hashlib.sha1(repr(params).encode()).hexdigest()[:12]
+
+
+def _relative(path):
+    return os.path.relpath(path, PROJECT_DIR).replace(os.sep, '/')
+
+
+def _is_execute_wrapper(code):
+    return {'execute', 'sql', 'params', 'many', 'context'} <= set(code.co_varnames[:code.co_argcount])
+
+
+def stack_origin():
+    """
+    Where in catalog/ a query came from: the innermost catalog template line being
+    rendered, else the innermost catalog Python frame. Querysets are often evaluated
+    by templates long after the view returned.
+    """
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if frame.f_code.co_name == 'render_annotated' and filename.endswith(os.path.join('template', 'base.py')):
+            node = frame.f_locals.get('self')
+            template = getattr(getattr(node, 'origin', None), 'name', None)
+            if isinstance(template, str) and template.startswith(CATALOG_DIR + os.sep):
+                return f'{_relative(template)}:{node.token.lineno}'
+        elif (filename.startswith(CATALOG_DIR + os.sep) and filename != __file__
+              and not _is_execute_wrapper(frame.f_code)):
+            return f'{_relative(filename)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return None
+
+
+class ExplainSampler:
+    """The slowest distinct fingerprints this process has seen; each is explained once while it stays among them."""
+
+    def __init__(self, size):
+        self.size = size
+        self.slowest = {}
+        self.lock = threading.Lock()
+
+    def wants(self, fingerprint, duration):
+        with self.lock:
+            if self.size <= 0 or fingerprint in self.slowest:
+                return False
+            if len(self.slowest) >= self.size:
+                fastest = min(self.slowest, key=self.slowest.get)
+                if self.slowest[fastest] >= duration:
+                    return False
+                del self.slowest[fastest]
+            self.slowest[fingerprint] = duration
+            return True
+
+
+def explain(sql, params):
+    if not sql.lstrip().upper().startswith(('SELECT', 'WITH')) or connection.needs_rollback:
+        return None
+    try:
+        # A savepoint, so a failing EXPLAIN cannot break the caller's transaction.
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}', params)
+            return '\n'.join(str(row[-1]) for row in cursor.fetchall())
+    except DatabaseError:
+        return None
+
+
+def write(path, records):
+    lines = ''.join(json.dumps(record, default=str) + '\n' for record in records)
+    with _write_lock, open(path, 'a', encoding='utf-8') as log:
+        log.write(lines)
+
+
+class SlowQueryRecorder:
+    """An execute wrapper that keeps the queries that took at least threshold_ms."""
+
+    def __init__(self, threshold_ms):
+        self.threshold = threshold_ms / 1000
+        self.slow = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            if duration >= self.threshold:
+                self.slow.append((sql, params, many, duration, stack_origin()))
+
+    def records(self, sampler=None, **extra):
+        """JSON-ready log lines, with EXPLAIN output for fingerprints the sampler asks for."""
+        now = timezone.now().isoformat()
+        for sql, params, many, duration, origin in self.slow:
+            record = {
+                'time': now, **extra,
+                'duration_ms': round(duration * 1000, 3),
+                'fingerprint': fingerprint(sql),
+                'sql': normalize(sql),
+                'params': params_fingerprint(params, many),
+                'many': many,
+                'origin': origin,
+            }
+            if sampler is not None and not many and sampler.wants(record['fingerprint'], duration):
+                record['explain'] = explain(sql, params)
+            yield record
+
+
+class SlowQueryMiddleware:
+    """
+    Log the slow queries of each request as JSON lines in SLOW_QUERY_LOG['PATH'],
+    tagged with the URL name of the view. Not loaded at all unless a path is set.
+    """
+
+    def __init__(self, get_response):
+        options = slow_query_log_settings()
+        if not options['PATH']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.path = options['PATH']
+        self.threshold = options['THRESHOLD_MS']
+        self.sampler = ExplainSampler(options['EXPLAIN_SAMPLES'])
+
+    def __call__(self, request):
+        recorder = SlowQueryRecorder(self.threshold)
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        if recorder.slow:
+            # The URL is resolved after the middleware runs, so the name is read afterwards.
+            match = getattr(request, 'resolver_match', None)
+            write(self.path, list(recorder.records(
+                self.sampler, view=match.view_name if match else None,
+                method=request.method, path=request.path, status=response.status_code,
+            )))
+        return response
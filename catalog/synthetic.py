@@ -0,0 +1,159 @@
+import datetime
+import itertools
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Permission, User
+from django.db.models import Max
+from django.utils import timezone
+
+from .branches import rebuild_availability
+from .loans import refresh_loan_stats
+from .models import Branch, Director, Genre, LoanEvent, Movie, MovieInstance, Screenwriter
+
+PASSWORD = 'load-test-password'
+
+FIRST_NAMES = ['Anna', 'Piotr', 'Maria', 'Jan', 'Ewa', 'Tomasz', 'Zofia', 'Adam', 'Olga', 'Marek',
+               'Laura', 'David', 'Sofia', 'James', 'Greta', 'Hugo', 'Ingrid', 'Luca', 'Nina', 'Oscar']
+LAST_NAMES = ['Nowak', 'Kowalski', 'Wisniewska', 'Lewandowski', 'Smith', 'Jones', 'Garcia', 'Rossi',
+              'Muller', 'Dubois', 'Novak', 'Berg', 'Larsen', 'Costa', 'Silva', 'Weber', 'Martin', 'Kim']
+WORDS = ['night', 'city', 'last', 'river', 'shadow', 'summer', 'road', 'silent', 'return', 'storm',
+         'house', 'winter', 'glass', 'empire', 'blue', 'secret', 'garden', 'iron', 'dream', 'lost']
+GENRES = ['Drama', 'Comedy', 'Thriller', 'Horror', 'Science fiction', 'Documentary', 'Romance',
+          'Animation', 'Western', 'Crime', 'Fantasy', 'War', 'Musical', 'Mystery', 'Adventure']
+CITIES = ['Warszawa', 'Krakow', 'Gdansk', 'Wroclaw', 'Poznan', 'Lodz', 'Lublin', 'Szczecin']
+PRODUCTIONS = ['DVD', 'Blu-ray', 'VHS', '4K UHD']
+
+
+def zipf_weights(n, exponent=1.1):
+    """Cumulative weights where the item of rank r is 1/r**exponent as likely as the first."""
+    return list(itertools.accumulate(1 / rank ** exponent for rank in range(1, n + 1)))
+
+
+class Skewed:
+    """Draws items of a population with Zipf-like popularity, most popular first after a shuffle."""
+
+    def __init__(self, rng, population, exponent=1.1):
+        self.rng = rng
+        self.population = list(population)
+        rng.shuffle(self.population)
+        self.cum_weights = zipf_weights(len(self.population), exponent)
+
+    def pick(self, k=1):
+        return self.rng.choices(self.population, cum_weights=self.cum_weights, k=k)
+
+    def one(self):
+        return self.pick()[0]
+
+
+def _insert(model, objects, batch_size):
+    # bulk_create does not report autoincrement keys on SQLite with this Django, so
+    # the new rows are read back as everything above the previous maximum.
+    before = model.objects.aggregate(last=Max('pk'))['last'] or 0
+    model.objects.bulk_create(objects, batch_size=batch_size)
+    return list(model.objects.filter(pk__gt=before).order_by('pk').values_list('pk', flat=True))
+
+
+def _person(rng, model):
+    born = datetime.date(rng.randint(1900, 1990), rng.randint(1, 12), rng.randint(1, 28))
+    died = born + datetime.timedelta(days=rng.randint(40, 90) * 365) if rng.random() < 0.2 else None
+    return model(first_name=rng.choice(FIRST_NAMES), last_name=rng.choice(LAST_NAMES),
+                 date_of_birth=born, date_of_death=died)
+
+
+def _title(rng):
+    return ' '.join(rng.sample(WORDS, rng.randint(1, 4))).capitalize()
+
+
+def generate(movies=1000, directors=None, screenwriters=None, genres=15, branches=5, copies=3.0,
+             users=200, on_loan=0.3, history=5000, prefix='loaduser', seed=0, batch_size=1000):
+    """
+    Add a synthetic catalog to the database. Directors, screenwriters, genres, branches,
+    movies and borrowers are all drawn with Zipf-like skew, so a few of each account
+    for most of the movies, copies and loans, as they do in a real rental.
+    Generated users share the password PASSWORD; `<prefix>staff` may mark copies returned.
+    """
+    rng = random.Random(seed)
+    directors = directors if directors is not None else max(1, movies // 10)
+    screenwriters = screenwriters if screenwriters is not None else max(1, movies // 8)
+    today = timezone.now().date()
+
+    genre_ids = _insert(Genre, [
+        Genre(name=GENRES[n % len(GENRES)] + (f' {n // len(GENRES) + 1}' if n >= len(GENRES) else ''))
+        for n in range(genres)
+    ], batch_size)
+    director_ids = _insert(Director, [_person(rng, Director) for _ in range(directors)], batch_size)
+    screenwriter_ids = _insert(Screenwriter, [_person(rng, Screenwriter) for _ in range(screenwriters)], batch_size)
+    branch_ids = _insert(Branch, [
+        Branch(name=f'Branch {n + 1}', city=CITIES[n % len(CITIES)], address=f'{rng.randint(1, 200)} {rng.choice(WORDS).capitalize()} Street')
+        for n in range(branches)
+    ], batch_size)
+
+    pick_director = Skewed(rng, director_ids)
+    pick_screenwriter = Skewed(rng, screenwriter_ids)
+    movie_ids = _insert(Movie, [
+        Movie(title=_title(rng), summary=' '.join(rng.choices(WORDS, k=30)).capitalize() + '.',
+              year_of_production=str(rng.randint(1950, today.year)),
+              director_id=pick_director.one(), screenwriter_id=pick_screenwriter.one())
+        for _ in range(movies)
+    ], batch_size)
+
+    pick_genre = Skewed(rng, genre_ids)
+    Movie.genre.through.objects.bulk_create([
+        Movie.genre.through(movie_id=movie_id, genre_id=genre_id)
+        for movie_id in movie_ids
+        for genre_id in set(pick_genre.pick(rng.randint(1, 3)))
+    ], batch_size=batch_size)
+
+    existing = set(User.objects.filter(username__startswith=prefix).values_list('username', flat=True))
+    password = make_password(PASSWORD)
+    user_ids = _insert(User, [
+        User(username=f'{prefix}{n}', password=password, email=f'{prefix}{n}@example.com')
+        for n in range(users) if f'{prefix}{n}' not in existing
+    ], batch_size)
+    user_ids += list(User.objects.filter(username__in=existing - {f'{prefix}staff'}).values_list('pk', flat=True))
+    if f'{prefix}staff' not in existing:
+        staff = User.objects.create_user(f'{prefix}staff', password=PASSWORD, is_staff=True)
+        staff.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+
+    # Popular movies get more copies and more loans; every movie has at least one copy.
+    pick_movie = Skewed(rng, movie_ids)
+    pick_branch = Skewed(rng, branch_ids, exponent=0.8)
+    pick_borrower = Skewed(rng, user_ids) if user_ids else None
+    extra = max(0, round(movies * copies) - movies)
+    instances, events = [], []
+    for movie_id in movie_ids + pick_movie.pick(extra):
+        instance = MovieInstance(movie_id=movie_id, branch_id=pick_branch.one() if branch_ids else None,
+                                 production=rng.choice(PRODUCTIONS), status='a')
+        roll = rng.random()
+        if pick_borrower is not None and roll < on_loan:
+            instance.status, instance.borrower_id = 'o', pick_borrower.one()
+            instance.due_back = today + datetime.timedelta(days=rng.randint(-10, 14))
+            events.append(LoanEvent(instance_id=instance.id, movie_id=movie_id, borrower_id=instance.borrower_id,
+                                    from_status='a', to_status='o', due_back=instance.due_back,
+                                    created=timezone.now() - datetime.timedelta(days=rng.randint(1, 14))))
+        elif roll > 0.98:
+            instance.status = 'm'
+        instances.append(instance)
+    MovieInstance.objects.bulk_create(instances, batch_size=batch_size)
+
+    # Completed loans of the past year, the same borrowers favouring the same movies.
+    for instance in (rng.choice(instances) for _ in range(history if pick_borrower is not None else 0)):
+        borrower_id = pick_borrower.one()
+        lent = timezone.now() - datetime.timedelta(days=rng.randint(30, 365), minutes=rng.randint(0, 1440))
+        returned = lent + datetime.timedelta(days=rng.randint(1, 21))
+        for from_status, to_status, created in (('a', 'o', lent), ('o', 'a', returned)):
+            events.append(LoanEvent(instance_id=instance.id, movie_id=instance.movie_id, borrower_id=borrower_id,
+                                    from_status=from_status, to_status=to_status, created=created))
+    events.sort(key=lambda event: event.created)
+    LoanEvent.objects.bulk_create(events, batch_size=batch_size)
+
+    # Bulk inserts skip the signals that maintain the derived tables.
+    rebuild_availability()
+    # Nothing else writes while the catalog is generated, so no safety lag is needed.
+    refresh_loan_stats(batch_size=batch_size, lag=datetime.timedelta())
+    return {
+        'genres': len(genre_ids), 'directors': len(director_ids), 'screenwriters': len(screenwriter_ids),
+        'branches': len(branch_ids), 'movies': len(movie_ids), 'copies': len(instances),
+        'users': len(user_ids), 'loan events': len(events),
+    }
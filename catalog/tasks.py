@@ -0,0 +1,53 @@
+import csv
+import io
+
+from django.contrib.auth.models import User
+from django.core.mail import EmailMessage, EmailMultiAlternatives
+
+from .jobs import task
+from .loans import refresh_loan_stats as refresh_loan_stats_now, has_unfolded_events, schedule_refresh
+from .models import LoanEvent, MovieInstance
+from .reservations import serve_waitlist as serve_waitlist_now
+
+
+@task()
+def send_email(subject, body, to, from_email=None, html_body=None):
+    message = EmailMultiAlternatives(subject, body, from_email, to)
+    if html_body is not None:
+        message.attach_alternative(html_body, 'text/html')
+    message.send()
+
+
+@task(unique=True)
+def refresh_loan_stats():
+    refresh_loan_stats_now()
+    # Events still inside the safety lag are left to a later run.
+    if has_unfolded_events():
+        schedule_refresh()
+
+
+@task()
+def serve_waitlist(instance_id):
+    # Retried with backoff by the job queue while the waitlist stays contended.
+    instance = MovieInstance.objects.filter(pk=instance_id, status='a', movie__isnull=False).first()
+    if instance is not None:
+        serve_waitlist_now(instance)
+
+
+@task()
+def export_loan_history(user_id):
+    user = User.objects.get(pk=user_id)
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['created', 'copy', 'movie', 'borrower', 'from status', 'to status', 'due back'])
+    events = LoanEvent.objects.select_related('movie', 'borrower').order_by('id')
+    for event in events.iterator(chunk_size=2000):
+        writer.writerow([
+            event.created.isoformat(), event.instance_id, event.movie.title if event.movie else '',
+            event.borrower.get_username() if event.borrower else '', event.from_status, event.to_status,
+            event.due_back or '',
+        ])
+
+    message = EmailMessage('Loan history export', 'The loan history export is attached.', None, [user.email])
+    message.attach('loan_history.csv', output.getvalue(), 'text/csv')
+    message.send()
@@ -0,0 +1,31 @@
+import functools
+import uuid
+
+from django import template
+from django.urls import NoReverseMatch, get_script_prefix, reverse
+
+register = template.Library()
+
+_PLACEHOLDERS = ('2147483647', str(uuid.UUID(int=0)))
+
+
+@functools.lru_cache(maxsize=None)
+def _url_parts(name, script_prefix):
+    for placeholder in _PLACEHOLDERS:
+        try:
+            url = reverse(name, args=[placeholder])
+        except NoReverseMatch:
+            continue
+        prefix, suffix = url.rsplit(placeholder, 1)
+        return prefix, suffix
+    raise NoReverseMatch(f"Reverse for '{name}' with a single id argument not found.")
+
+
+@register.filter
+def row_url(pk, name):
+    """
+    `{{ movie.id|row_url:'movie-update' }}` builds the same URL as `{% url 'movie-update' movie.id %}`
+    from a prefix and suffix resolved once per process, instead of reversing it for every row.
+    """
+    prefix, suffix = _url_parts(name, get_script_prefix())
+    return f'{prefix}{pk}{suffix}'
@@ -0,0 +1,101 @@
+import datetime
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from catalog import archive
+from catalog.models import (ArchivedLoanEvent, ArchivedMovieInstance, Branch, BranchAvailability, LoanEvent,
+                            Movie, MovieInstance, Reservation)
+
+@override_settings(LOAN_STATS_SAFETY_LAG=0)
+class ArchiveTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser1', password='1X<ISRUkw+tuK')
+        self.branch = Branch.objects.create(name='North', city='Gdansk')
+        self.movie = Movie.objects.create(title='Movie Title', summary='My movie summary', year_of_production='2004')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.copy = MovieInstance.objects.create(movie=self.movie, branch=self.branch, status='o', borrower=self.user)
+            self.keep = MovieInstance.objects.create(movie=self.movie, branch=self.branch, status='a')
+            self.copy = MovieInstance.objects.get(pk=self.copy.pk)
+            self.copy.status = 'a'
+            self.copy.save()
+        self.long_ago = datetime.date.today() - archive.ARCHIVE_AFTER - datetime.timedelta(days=1)
+
+    def counts(self):
+        counter = BranchAvailability.objects.get(branch=self.branch, movie=self.movie)
+        return counter.available, counter.copies
+
+    def test_retired_copies_are_hidden_but_kept(self):
+        archive.retire(self.copy, self.long_ago)
+        self.assertEqual(list(MovieInstance.objects.all()), [self.keep])
+        self.assertEqual(list(self.movie.movieinstance_set.all()), [self.keep])
+        self.assertEqual(MovieInstance.all_objects.count(), 2)
+        self.assertEqual(self.counts(), (1, 1))
+
+    def test_admin_lists_and_unretires_retired_copies(self):
+        User.objects.create_superuser(username='admin1', password='2HJ1vRV0Z&3iD')
+        self.client.login(username='admin1', password='2HJ1vRV0Z&3iD')
+        archive.retire(self.copy, self.long_ago)
+        changelist = reverse('admin:catalog_movieinstance_changelist')
+
+        response = self.client.get(changelist, {'retired_on__isnull': 'False'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.copy])
+        self.client.post(changelist, {'action': 'unretire_copies', '_selected_action': [str(self.copy.pk)]})
+        self.assertIsNone(MovieInstance.objects.get(pk=self.copy.pk).retired_on)
+        self.assertEqual(self.counts(), (1, 2))
+
+    def test_copies_on_loan_cannot_be_retired(self):
+        self.keep.status = 'o'
+        with self.assertRaises(archive.CopyOnLoan):
+            archive.retire(self.keep)
+
+    def test_archive_moves_copies_and_events(self):
+        archive.retire(self.copy, self.long_ago)
+        archive.retire(self.keep)
+        events = LoanEvent.objects.filter(instance_id=self.copy.pk).count()
+        self.assertGreater(events, 0)
+
+        self.assertEqual(archive.archive_retired(batch_size=1), 1)
+        self.assertFalse(MovieInstance.all_objects.filter(pk=self.copy.pk).exists())
+        self.assertFalse(LoanEvent.objects.filter(instance_id=self.copy.pk).exists())
+        self.assertEqual(ArchivedLoanEvent.objects.filter(instance_id=self.copy.pk).count(), events)
+        self.assertTrue(MovieInstance.all_objects.filter(pk=self.keep.pk).exists())
+
+    @override_settings(LOAN_STATS_SAFETY_LAG=60)
+    def test_copies_with_uncounted_events_wait(self):
+        archive.retire(self.copy, self.long_ago)
+        self.assertEqual(archive.archive_retired(), 0)
+        self.assertTrue(MovieInstance.all_objects.filter(pk=self.copy.pk).exists())
+
+    def test_restore_brings_copies_back(self):
+        reservation = Reservation.objects.create(movie=self.movie, user=self.user, ticket=1, instance=self.copy)
+        archive.retire(self.copy, self.long_ago)
+        archive.archive_retired()
+        self.assertIsNone(Reservation.objects.get(pk=reservation.pk).instance)
+
+        self.assertEqual(archive.restore(), 1)
+        restored = MovieInstance.objects.get(pk=self.copy.pk)
+        self.assertEqual((restored.status, restored.retired_on, restored.branch), ('m', None, self.branch))
+        self.assertTrue(LoanEvent.objects.filter(instance_id=self.copy.pk).exists())
+        self.assertFalse(ArchivedMovieInstance.objects.exists())
+        self.assertEqual(self.counts(), (1, 2))
+
+    def test_archived_movie_can_be_deleted(self):
+        movie = Movie.objects.create(title='Gone', summary='-', year_of_production='1999')
+        copy = MovieInstance.objects.create(movie=movie, status='m')
+        archive.retire(copy, self.long_ago)
+        archive.archive_retired()
+        movie.delete()
+        self.assertEqual(archive.restore(), 0)
+        self.assertTrue(ArchivedMovieInstance.objects.filter(pk=copy.pk).exists())
+
+    def test_commands(self):
+        archive.retire(self.copy, self.long_ago)
+        out = StringIO()
+        call_command('archive_retired', stdout=out)
+        self.assertIn('Archived 1 copies', out.getvalue())
+        call_command('restore_archived', str(self.copy.pk), stdout=out)
+        self.assertIn('Restored 1 copies', out.getvalue())
@@ -0,0 +1,88 @@
+from django.contrib.auth.models import User, Group, Permission
+from django.db import connection
+from django.db.models.signals import m2m_changed
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+PERMISSION = 'catalog.can_mark_returned'
+
+class CachedPermissionBackendTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser1', password='1X<ISRUkw+tuK')
+        self.permission = Permission.objects.get(name='Set movie as returned')
+        self.group = Group.objects.create(name='Staff')
+
+    def fresh_user(self):
+        # A new object per request, as the authentication middleware loads it.
+        return User.objects.get(pk=self.user.pk)
+
+    def test_permission_checks_cost_no_queries_after_first(self):
+        self.user.user_permissions.add(self.permission)
+        self.assertTrue(self.fresh_user().has_perm(PERMISSION))
+
+        user = self.fresh_user()
+        with self.assertNumQueries(0):
+            self.assertTrue(user.has_perm(PERMISSION))
+            self.assertTrue(user.has_module_perms('catalog'))
+            self.assertFalse(user.has_perm('catalog.add_movie'))
+
+    def test_user_permission_change_invalidates(self):
+        self.assertFalse(self.fresh_user().has_perm(PERMISSION))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.user_permissions.add(self.permission)
+        self.assertTrue(self.fresh_user().has_perm(PERMISSION))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.user_permissions.remove(self.permission)
+        self.assertFalse(self.fresh_user().has_perm(PERMISSION))
+
+    def test_group_membership_change_invalidates(self):
+        self.group.permissions.add(self.permission)
+        self.assertFalse(self.fresh_user().has_perm(PERMISSION))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.group.user_set.add(self.user)
+        self.assertTrue(self.fresh_user().has_perm(PERMISSION))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.groups.clear()
+        self.assertFalse(self.fresh_user().has_perm(PERMISSION))
+
+    def test_group_permission_change_invalidates_members(self):
+        self.user.groups.add(self.group)
+        self.assertFalse(self.fresh_user().has_perm(PERMISSION))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.group.permissions.add(self.permission)
+        self.assertTrue(self.fresh_user().has_perm(PERMISSION))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.permission.group_set.clear()
+        self.assertFalse(self.fresh_user().has_perm(PERMISSION))
+
+    def test_entries_rebuilt_during_a_clear_are_dropped(self):
+        self.user.user_permissions.add(self.permission)
+
+        def read_before_delete(action, **kwargs):
+            # Another request checking permissions while the rows are being cleared.
+            if action == 'pre_clear':
+                self.assertTrue(self.fresh_user().has_perm(PERMISSION))
+
+        m2m_changed.connect(read_before_delete, sender=User.user_permissions.through)
+        self.addCleanup(m2m_changed.disconnect, read_before_delete, sender=User.user_permissions.through)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.permission.user_set.clear()
+        self.assertFalse(self.fresh_user().has_perm(PERMISSION))
+
+    def test_deactivated_user_loses_permissions(self):
+        self.user.user_permissions.add(self.permission)
+        self.assertTrue(self.fresh_user().has_perm(PERMISSION))
+        self.user.is_active = False
+        self.user.save()
+        self.assertFalse(self.fresh_user().has_perm(PERMISSION))
+
+    def test_permission_required_view_query_count(self):
+        self.user.user_permissions.add(self.permission)
+        self.client.login(username='testuser1', password='1X<ISRUkw+tuK')
+        self.client.get(reverse('all-borrowed'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('all-borrowed'))
+        self.assertEqual(response.status_code, 200)
+        permission_queries = [q['sql'] for q in queries if 'auth_permission' in q['sql'] or 'auth_group' in q['sql']]
+        self.assertEqual(permission_queries, [])
@@ -0,0 +1,118 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog import branches, reservations
+from catalog.models import Branch, BranchAvailability, Movie, MovieInstance
+
+class BranchAvailabilityTest(TestCase):
+    def setUp(self):
+        self.north = Branch.objects.create(name='North', city='Gdansk')
+        self.south = Branch.objects.create(name='South', city='Krakow')
+        self.movie = Movie.objects.create(title='Movie Title', summary='My movie summary', year_of_production='2004')
+
+    def counts(self, branch):
+        counter = BranchAvailability.objects.filter(branch=branch, movie=self.movie).first()
+        return (counter.available, counter.copies) if counter else None
+
+    def test_new_copies_are_counted(self):
+        MovieInstance.objects.create(movie=self.movie, branch=self.north, status='a')
+        MovieInstance.objects.create(movie=self.movie, branch=self.north, status='m')
+        MovieInstance.objects.create(movie=self.movie, status='a')
+        self.assertEqual(self.counts(self.north), (1, 2))
+        self.assertIsNone(self.counts(self.south))
+
+    def test_status_changes_move_availability(self):
+        copy = MovieInstance.objects.create(movie=self.movie, branch=self.north, status='a')
+        copy = MovieInstance.objects.get(pk=copy.pk)
+        copy.status = 'o'
+        copy.save()
+        self.assertEqual(self.counts(self.north), (0, 1))
+        copy.status = 'a'
+        copy.save()
+        self.assertEqual(self.counts(self.north), (1, 1))
+
+    def test_refreshed_copy_counts_from_its_reloaded_status(self):
+        copy = MovieInstance.objects.create(movie=self.movie, branch=self.north, status='o')
+        copy = MovieInstance.objects.get(pk=copy.pk)
+        returned = MovieInstance.objects.get(pk=copy.pk)
+        returned.status = 'a'
+        returned.save()
+        self.assertEqual(self.counts(self.north), (1, 1))
+
+        copy.refresh_from_db()
+        copy.status = 'm'
+        copy.save()
+        self.assertEqual(self.counts(self.north), (0, 1))
+
+    def test_moving_a_copy_between_branches(self):
+        copy = MovieInstance.objects.create(movie=self.movie, branch=self.north, status='a')
+        copy = MovieInstance.objects.get(pk=copy.pk)
+        copy.branch = self.south
+        copy.save()
+        self.assertEqual(self.counts(self.north), (0, 0))
+        self.assertEqual(self.counts(self.south), (1, 1))
+
+    def test_deleted_copies_are_released(self):
+        copy = MovieInstance.objects.create(movie=self.movie, branch=self.north, status='a')
+        MovieInstance.objects.get(pk=copy.pk).delete()
+        self.assertEqual(self.counts(self.north), (0, 0))
+
+    def test_deleting_a_branch_drops_its_counters(self):
+        copy = MovieInstance.objects.create(movie=self.movie, branch=self.north, status='a')
+        self.north.delete()
+        self.assertFalse(BranchAvailability.objects.exists())
+        MovieInstance.objects.get(pk=copy.pk).delete()
+        self.assertFalse(BranchAvailability.objects.exists())
+
+    def test_copy_handed_to_waitlist_is_not_available(self):
+        user = User.objects.create_user(username='testuser1', password='1X<ISRUkw+tuK')
+        copy = MovieInstance.objects.create(movie=self.movie, branch=self.north, status='o', borrower=user)
+        reservations.reserve(self.movie, user)
+        copy = MovieInstance.objects.get(pk=copy.pk)
+        copy.status = 'a'
+        copy.save()
+        self.assertEqual(copy.status, 'r')
+        self.assertEqual(self.counts(self.north), (0, 1))
+
+    def test_available_at_filters_by_city(self):
+        MovieInstance.objects.create(movie=self.movie, branch=self.north, status='a')
+        MovieInstance.objects.create(movie=self.movie, branch=self.south, status='o')
+        self.assertEqual([c.branch for c in branches.available_at(self.movie)], [self.north])
+        self.assertEqual(list(branches.available_at(self.movie, 'krakow')), [])
+        self.assertEqual([c.branch for c in branches.available_at(self.movie, 'gdansk')], [self.north])
+
+    def test_rebuild_matches_incremental_counters(self):
+        MovieInstance.objects.create(movie=self.movie, branch=self.north, status='a')
+        MovieInstance.objects.create(movie=self.movie, branch=self.north, status='o')
+        MovieInstance.objects.bulk_create([MovieInstance(movie=self.movie, branch=self.south, status='a')])
+        self.assertIsNone(self.counts(self.south))
+        self.assertEqual(branches.rebuild_availability(), 2)
+        self.assertEqual(self.counts(self.north), (1, 2))
+        self.assertEqual(self.counts(self.south), (1, 1))
+
+class BranchViewsTest(TestCase):
+    def setUp(self):
+        self.branch = Branch.objects.create(name='North', city='Gdansk')
+        Branch.objects.create(name='South', city='Krakow')
+        self.movie = Movie.objects.create(title='Movie Title', summary='My movie summary', year_of_production='2004')
+        MovieInstance.objects.create(movie=self.movie, branch=self.branch, status='a')
+
+    def test_list_filters_by_city(self):
+        response = self.client.get(reverse('branches'), {'city': 'gdansk'})
+        self.assertEqual(list(response.context['branch_list']), [self.branch])
+
+    def test_detail_lists_counters(self):
+        response = self.client.get(reverse('branch-detail', args=[self.branch.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Movie Title')
+        self.assertContains(response, '1 of 1 available')
+
+    def test_movie_detail_remembers_city(self):
+        url = reverse('movie-detail', args=[self.movie.pk])
+        response = self.client.get(url, {'city': 'Krakow'})
+        self.assertEqual(list(response.context['available_branches']), [])
+        response = self.client.get(url)
+        self.assertEqual(response.context['city'], 'Krakow')
+        response = self.client.get(url, {'city': ''})
+        self.assertEqual([c.branch for c in response.context['available_branches']], [self.branch])
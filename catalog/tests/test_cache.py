@@ -0,0 +1,87 @@
+import threading
+import time
+
+from django.core.cache import caches
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog.cache import get_or_set, _local_locks, MOVIES_FIRST_PAGE_KEY
+from catalog.models import Movie, Director
+
+class GetOrSetTest(TestCase):
+    def test_value_is_cached(self):
+        calls = []
+        for _ in range(3):
+            self.assertEqual(get_or_set('key', lambda: calls.append(1) or 'value'), 'value')
+        self.assertEqual(len(calls), 1)
+
+    def test_concurrent_misses_recompute_once_per_key(self):
+        calls = {'first': 0, 'second': 0}
+        guard = threading.Lock()
+        results = []
+        barrier = threading.Barrier(16)
+
+        def producer(key):
+            with guard:
+                calls[key] += 1
+            time.sleep(0.2)
+            return f'{key}-value'
+
+        def reader(key):
+            barrier.wait()
+            results.append(get_or_set(key, lambda: producer(key)))
+
+        threads = [threading.Thread(target=reader, args=(key,)) for key in ('first', 'second') * 8]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(calls, {'first': 1, 'second': 1})
+        self.assertEqual(sorted(set(results)), ['first-value', 'second-value'])
+        self.assertEqual(len(results), 16)
+
+    def test_local_locks_are_released_after_use(self):
+        for user_id in range(100):
+            get_or_set(f'catalog:borrowed:{user_id}', lambda: 0)
+        self.assertEqual(len(_local_locks), 0)
+
+    def test_entry_is_refreshed_early_near_expiry(self):
+        cache = caches['default']
+        cache.set('key', ('old', 10.0, time.time() + 1), 60)
+        self.assertEqual(get_or_set('key', lambda: 'new', beta=1000.0), 'new')
+
+    def test_stale_value_is_served_while_another_worker_recomputes(self):
+        cache = caches['default']
+        cache.set('key', ('old', 10.0, time.time() + 1), 60)
+        cache.add('key:lock', True, 30)
+        self.assertEqual(get_or_set('key', lambda: 'new', beta=1000.0), 'old')
+
+class MoviesFirstPageCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        director = Director.objects.create(first_name='Michael', last_name='Cash')
+        for number in range(13):
+            Movie.objects.create(title=f'Movie {number}', summary='-', year_of_production='2004', director=director)
+
+    def test_first_page_is_cached(self):
+        response = self.client.get(reverse('movies'))
+        self.assertEqual(len(response.context['movie_list']), 10)
+        self.assertTrue(response.context['is_paginated'])
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('movies'))
+        self.assertEqual(response.context['page_obj'].paginator.num_pages, 2)
+
+    def test_changes_invalidate_first_page(self):
+        self.client.get(reverse('movies'))
+        self.assertIsNotNone(caches['default'].get(MOVIES_FIRST_PAGE_KEY))
+        with self.captureOnCommitCallbacks(execute=True):
+            Movie.objects.create(title='Newcomer', summary='-', year_of_production='2022')
+            # Kept until the writer commits, so nobody re-caches the uncommitted state.
+            self.assertIsNotNone(caches['default'].get(MOVIES_FIRST_PAGE_KEY))
+        self.assertIsNone(caches['default'].get(MOVIES_FIRST_PAGE_KEY))
+
+    def test_other_pages_are_not_cached(self):
+        response = self.client.get(reverse('movies') + '?page=2')
+        self.assertEqual(len(response.context['movie_list']), 3)
+        self.assertIsNone(caches['default'].get(MOVIES_FIRST_PAGE_KEY))
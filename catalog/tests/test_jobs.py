@@ -0,0 +1,99 @@
+import datetime
+
+from django.contrib.auth.models import User, Permission
+from django.core import mail
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from catalog import jobs
+from catalog.models import Job, Movie, MovieInstance, MovieLoanStats
+
+calls = []
+
+@jobs.task(name='tests.record', max_attempts=3)
+def record(value):
+    calls.append(value)
+
+@jobs.task(name='tests.explode', max_attempts=2)
+def explode():
+    raise RuntimeError('boom')
+
+class JobQueueTest(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_delay_queues_until_a_worker_runs(self):
+        job = record.delay(value=1)
+        self.assertEqual(job.status, 'q')
+        self.assertEqual(calls, [])
+
+        self.assertEqual(jobs.work(burst=True), 1)
+        self.assertEqual(calls, [1])
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'd')
+        self.assertEqual(job.attempts, 1)
+
+    def test_job_is_claimed_once(self):
+        job = record.delay(value=1)
+        self.assertEqual(jobs.claim('first').id, job.id)
+        self.assertIsNone(jobs.claim('second'))
+
+    def test_failed_job_is_retried_with_backoff_then_given_up(self):
+        job = explode.delay()
+        jobs.work(burst=True)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'q')
+        self.assertIn('RuntimeError: boom', job.last_error)
+        self.assertGreater(job.run_after, timezone.now())
+
+        Job.objects.filter(id=job.id).update(run_after=timezone.now())
+        jobs.work(burst=True)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'f')
+        self.assertEqual(job.attempts, 2)
+
+    def test_stale_running_job_is_requeued(self):
+        job = record.delay(value=1)
+        jobs.claim('crashed')
+        Job.objects.filter(id=job.id).update(locked_at=timezone.now() - jobs.LOCK_TIMEOUT - datetime.timedelta(seconds=1))
+        self.assertEqual(jobs.requeue_stale(), 1)
+        jobs.work(burst=True)
+        self.assertEqual(calls, [1])
+
+    def test_unique_task_is_queued_once(self):
+        from catalog.tasks import refresh_loan_stats
+        Job.objects.all().delete()
+        first = refresh_loan_stats.delay()
+        self.assertEqual(refresh_loan_stats.delay(), first)
+
+class SideEffectJobsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser1', password='1X<ISRUkw+tuK', email='user@example.com')
+
+    def test_password_reset_email_is_sent_by_worker(self):
+        response = self.client.post(reverse('password_reset'), {'email': 'user@example.com'})
+        self.assertRedirects(response, reverse('password_reset_done'))
+        self.assertEqual(len(mail.outbox), 0)
+
+        jobs.work(burst=True)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['user@example.com'])
+
+    @override_settings(LOAN_STATS_SAFETY_LAG=0)
+    def test_loan_changes_schedule_stats_refresh(self):
+        movie = Movie.objects.create(title='Movie Title', summary='My movie summary', year_of_production='2004')
+        with self.captureOnCommitCallbacks(execute=True):
+            MovieInstance.objects.create(movie=movie, status='o', borrower=self.user)
+        jobs.work(burst=True)
+        self.assertEqual(MovieLoanStats.objects.get(movie=movie).loan_count, 1)
+
+    def test_loan_history_export_is_emailed(self):
+        self.user.user_permissions.add(Permission.objects.get(name='Set movie as returned'))
+        self.client.login(username='testuser1', password='1X<ISRUkw+tuK')
+        response = self.client.post(reverse('loan-history-export'))
+        self.assertRedirects(response, reverse('loan-analytics'))
+
+        jobs.work(burst=True)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].attachments[0][0], 'loan_history.csv')
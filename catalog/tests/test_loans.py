@@ -0,0 +1,138 @@
+import datetime
+
+from django.contrib.auth.models import User, Permission
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from catalog.loans import refresh_loan_stats
+from catalog.models import (
+    Movie, MovieInstance, LoanEvent, MovieLoanStats, UserLoanStats, InstanceLoanStats,
+)
+
+@override_settings(LOAN_STATS_SAFETY_LAG=0)
+class LoanEventTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser1', password='1X<ISRUkw+tuK')
+        self.movie = Movie.objects.create(title='Movie Title', summary='My movie summary', year_of_production='2004')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.copy = MovieInstance.objects.create(movie=self.movie, production='USA', status='a')
+
+    def lend(self, copy, days_ago):
+        with self.captureOnCommitCallbacks(execute=True):
+            copy.status = 'o'
+            copy.borrower = self.user
+            copy.save()
+        LoanEvent.objects.filter(instance=copy, to_status='o').update(
+            created=timezone.now() - datetime.timedelta(days=days_ago))
+
+    def give_back(self, copy):
+        with self.captureOnCommitCallbacks(execute=True):
+            copy.status = 'a'
+            copy.borrower = None
+            copy.save()
+
+    def test_creation_is_recorded(self):
+        event = LoanEvent.objects.get(instance=self.copy)
+        self.assertEqual(event.from_status, '')
+        self.assertEqual(event.to_status, 'a')
+
+    def test_save_without_status_change_is_not_recorded(self):
+        copy = MovieInstance.objects.get(pk=self.copy.pk)
+        copy.production = 'UK'
+        copy.save()
+        self.assertEqual(LoanEvent.objects.filter(instance=self.copy).count(), 1)
+
+    def test_transitions_are_recorded_in_order(self):
+        self.lend(self.copy, days_ago=0)
+        self.give_back(self.copy)
+        transitions = list(LoanEvent.objects.filter(instance=self.copy).values_list('from_status', 'to_status'))
+        self.assertEqual(transitions, [('', 'a'), ('a', 'o'), ('o', 'a')])
+
+    def test_events_roll_back_with_their_savepoint(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            other = MovieInstance.objects.create(movie=self.movie, production='USA', status='a')
+        with transaction.atomic():
+            self.copy.status = 'o'
+            self.copy.save()
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                other.status = 'o'
+                other.save()
+                raise RuntimeError
+        self.assertEqual(MovieInstance.objects.get(pk=other.pk).status, 'a')
+        self.assertFalse(LoanEvent.objects.filter(instance=other, to_status='o').exists())
+        self.assertTrue(LoanEvent.objects.filter(instance=self.copy, to_status='o').exists())
+
+    def test_refresh_builds_rollups(self):
+        self.lend(self.copy, days_ago=4)
+        self.give_back(self.copy)
+        refresh_loan_stats()
+
+        movie_stats = MovieLoanStats.objects.get(movie=self.movie)
+        self.assertEqual(movie_stats.loan_count, 1)
+        self.assertEqual(movie_stats.returned_count, 1)
+        self.assertEqual(movie_stats.average_loan_time.days, 4)
+        user_stats = UserLoanStats.objects.get(user=self.user)
+        self.assertEqual(user_stats.returned_count, 1)
+        self.assertEqual(InstanceLoanStats.objects.get(instance=self.copy).loan_count, 1)
+
+    def test_refresh_is_incremental(self):
+        self.lend(self.copy, days_ago=2)
+        self.assertEqual(refresh_loan_stats(), 2)
+        self.assertIsNotNone(InstanceLoanStats.objects.get(instance=self.copy).loan_started)
+
+        self.give_back(self.copy)
+        self.assertEqual(refresh_loan_stats(), 1)
+        self.assertEqual(refresh_loan_stats(), 0)
+        movie_stats = MovieLoanStats.objects.get(movie=self.movie)
+        self.assertEqual(movie_stats.loan_count, 1)
+        self.assertEqual(movie_stats.average_loan_time.days, 2)
+
+    @override_settings(LOAN_STATS_SAFETY_LAG=60)
+    def test_recent_events_wait_for_the_safety_lag(self):
+        self.lend(self.copy, days_ago=2)
+        self.assertEqual(refresh_loan_stats(), 0)
+
+        # An older event behind a recent one waits too: the recent id may have a
+        # lower neighbour that is not committed yet.
+        first, second = LoanEvent.objects.filter(instance=self.copy).order_by('id')
+        LoanEvent.objects.filter(pk=second.pk).update(recorded=timezone.now() - datetime.timedelta(minutes=5))
+        self.assertEqual(refresh_loan_stats(), 0)
+
+        LoanEvent.objects.filter(pk=first.pk).update(recorded=timezone.now() - datetime.timedelta(minutes=5))
+        self.assertEqual(refresh_loan_stats(), 2)
+        self.assertEqual(MovieLoanStats.objects.get(movie=self.movie).loan_count, 1)
+
+@override_settings(LOAN_STATS_SAFETY_LAG=0)
+class LoanAnalyticsViewTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser1', password='1X<ISRUkw+tuK')
+        self.staff = User.objects.create_user(username='testuser2', password='2HJ1vRV0Z&3iD')
+        self.staff.user_permissions.add(Permission.objects.get(name='Set movie as returned'))
+        movie = Movie.objects.create(title='Movie Title', summary='My movie summary', year_of_production='2004')
+        with self.captureOnCommitCallbacks(execute=True):
+            MovieInstance.objects.create(movie=movie, production='USA', status='o', borrower=self.user)
+        refresh_loan_stats()
+
+    def test_forbidden_without_permission(self):
+        self.client.login(username='testuser1', password='1X<ISRUkw+tuK')
+        response = self.client.get(reverse('loan-analytics'))
+        self.assertEqual(response.status_code, 403)
+
+    def test_reads_rollups_only(self):
+        self.client.login(username='testuser2', password='2HJ1vRV0Z&3iD')
+        response = self.client.get(reverse('loan-analytics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'catalog/loan_analytics.html')
+        self.assertEqual(response.context['top_movies'][0].loan_count, 1)
+        self.assertEqual(response.context['top_users'][0].user, self.user)
+
+    def test_does_not_scan_loan_events(self):
+        self.client.login(username='testuser2', password='2HJ1vRV0Z&3iD')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('loan-analytics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(any('catalog_movieloanstats' in query['sql'] for query in queries))
+        self.assertFalse(any('catalog_loanevent' in query['sql'] for query in queries))
@@ -1,6 +1,8 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
-from catalog.models import Screenwriter
+from catalog.models import ConcurrentUpdateError, Director, Screenwriter
 
 class ScreenwriterModelTest(TestCase):
     @classmethod
@@ -32,3 +34,53 @@ class ScreenwriterModelTest(TestCase):
         screenwriter = Screenwriter.objects.get(id=1)
         # This will also fail if the urlconf is not defined.
         self.assertEqual(screenwriter.get_absolute_url(), '/catalog/screenwriter/1')
+
+class VersionedModelTest(TestCase):
+    def setUp(self):
+        self.director = Director.objects.create(first_name='Michael', last_name='Cash')
+
+    def test_update_writes_changed_columns_and_bumps_version(self):
+        director = Director.objects.get(pk=self.director.pk)
+        director.last_name = 'Kesh'
+        with CaptureQueriesContext(connection) as queries:
+            director.save()
+        update, = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('UPDATE')]
+        self.assertIn('"last_name"', update)
+        self.assertNotIn('"first_name"', update)
+        self.assertEqual(director.version, 2)
+        self.assertEqual(Director.objects.get(pk=self.director.pk).version, 2)
+
+    def test_unchanged_save_writes_nothing(self):
+        director = Director.objects.get(pk=self.director.pk)
+        with self.assertNumQueries(0):
+            director.save()
+        self.assertEqual(director.version, 1)
+
+    def test_stale_copy_is_rejected(self):
+        first = Director.objects.get(pk=self.director.pk)
+        second = Director.objects.get(pk=self.director.pk)
+        first.first_name = 'Mike'
+        first.save()
+        second.last_name = 'Kesh'
+        with self.assertRaises(ConcurrentUpdateError):
+            second.save()
+        self.assertEqual(second.version, 1)
+        self.assertEqual(Director.objects.get(pk=self.director.pk).last_name, 'Cash')
+
+    def test_refresh_resets_the_loaded_state(self):
+        first = Director.objects.get(pk=self.director.pk)
+        second = Director.objects.get(pk=self.director.pk)
+        second.first_name = 'Mike'
+        second.save()
+        first.refresh_from_db()
+        with self.assertNumQueries(0):
+            first.save()
+        first.last_name = 'Kesh'
+        first.save()
+        self.assertEqual(Director.objects.get(pk=self.director.pk).first_name, 'Mike')
+
+    def test_deferred_fields_that_were_set_are_written(self):
+        director = Director.objects.only('first_name').get(pk=self.director.pk)
+        director.last_name = 'Kesh'
+        director.save()
+        self.assertEqual(Director.objects.get(pk=self.director.pk).last_name, 'Kesh')
@@ -0,0 +1,88 @@
+import numpy as np
+from scipy import sparse
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog.models import Movie, MovieInstance, MovieNeighbour, Director, Screenwriter, Genre
+from catalog.recommendations import (
+    nearest_neighbours, rebuild_recommendations, rebuild_stale_recommendations,
+)
+
+class NearestNeighboursTest(TestCase):
+    def test_chunking_does_not_change_results(self):
+        matrix = sparse.random(60, 12, density=0.2, format='csr', random_state=7)
+        rows = np.arange(60)
+        whole = [np.concatenate(parts) for parts in zip(*(r[1:] for r in nearest_neighbours(matrix, rows, 5, budget=10 ** 9)))]
+        small = [np.concatenate(parts) for parts in zip(*(r[1:] for r in nearest_neighbours(matrix, rows, 5, budget=1)))]
+        for expected, actual in zip(whole, small):
+            np.testing.assert_allclose(expected, actual)
+
+    def test_excludes_self_and_keeps_top_k(self):
+        matrix = sparse.csr_matrix(np.ones((4, 2)))
+        (_, sources, targets, ranks, _), = nearest_neighbours(matrix, np.arange(4), top_k=2)
+        self.assertFalse(np.any(sources == targets))
+        self.assertEqual(np.bincount(sources).tolist(), [2, 2, 2, 2])
+        self.assertEqual(sorted(set(ranks.tolist())), [0, 1])
+
+class RebuildRecommendationsTest(TestCase):
+    def setUp(self):
+        director = Director.objects.create(first_name='Michael', last_name='Cash')
+        screenwriter = Screenwriter.objects.create(first_name='John', last_name='Smith')
+        fantasy = Genre.objects.create(name='Fantasy')
+        drama = Genre.objects.create(name='Drama')
+
+        self.first = Movie.objects.create(title='First', summary='-', year_of_production='2004',
+                                          director=director, screenwriter=screenwriter)
+        self.sequel = Movie.objects.create(title='Sequel', summary='-', year_of_production='2006',
+                                           director=director, screenwriter=screenwriter)
+        self.cousin = Movie.objects.create(title='Cousin', summary='-', year_of_production='2010')
+        self.other = Movie.objects.create(title='Other', summary='-', year_of_production='1990')
+        self.first.genre.set([fantasy])
+        self.sequel.genre.set([fantasy])
+        self.cousin.genre.set([fantasy])
+        self.other.genre.set([drama])
+
+    def test_shared_people_rank_first(self):
+        rebuild_recommendations()
+        neighbours = list(MovieNeighbour.objects.filter(movie=self.first).values_list('neighbour_id', flat=True))
+        self.assertEqual(neighbours, [self.sequel.id, self.cousin.id])
+        self.assertFalse(MovieNeighbour.objects.filter(movie=self.other).exists())
+
+    def test_co_borrowing_links_movies(self):
+        user = User.objects.create_user(username='testuser1', password='1X<ISRUkw+tuK')
+        with self.captureOnCommitCallbacks(execute=True):
+            for movie in (self.first, self.other):
+                MovieInstance.objects.create(movie=movie, status='o', borrower=user)
+        rebuild_recommendations()
+        self.assertTrue(MovieNeighbour.objects.filter(movie=self.other, neighbour=self.first).exists())
+
+    def test_incremental_rebuild_only_touches_stale_movies(self):
+        self.assertEqual(rebuild_stale_recommendations(), 4)
+        self.assertEqual(rebuild_stale_recommendations(), 0)
+
+        newcomer = Movie.objects.create(title='Newcomer', summary='-', year_of_production='2022')
+        newcomer.genre.set(self.other.genre.all())
+        # The newcomer and the one movie sharing its genre.
+        self.assertEqual(rebuild_stale_recommendations(), 2)
+        self.assertTrue(MovieNeighbour.objects.filter(movie=newcomer, neighbour=self.other).exists())
+        self.assertTrue(MovieNeighbour.objects.filter(movie=self.other, neighbour=newcomer).exists())
+
+    def test_incremental_rebuild_picks_up_edits(self):
+        rebuild_stale_recommendations()
+        self.cousin.genre.set(self.other.genre.all())
+        # Cousin, its former neighbours and the movies of its new genre.
+        self.assertEqual(rebuild_stale_recommendations(), 4)
+        self.assertFalse(MovieNeighbour.objects.filter(movie=self.first, neighbour=self.cousin).exists())
+        self.assertTrue(MovieNeighbour.objects.filter(movie=self.other, neighbour=self.cousin).exists())
+
+        self.other.title = 'Renamed'
+        self.other.save()
+        self.assertEqual(rebuild_stale_recommendations(), 0)
+
+    def test_detail_view_shows_similar_movies(self):
+        rebuild_recommendations()
+        response = self.client.get(reverse('movie-detail', args=[self.first.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['similar_movies'], [self.sequel, self.cousin])
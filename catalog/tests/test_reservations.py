@@ -0,0 +1,152 @@
+import threading
+import time
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction, IntegrityError, OperationalError
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+
+from catalog import jobs, reservations
+from catalog.models import Movie, MovieInstance, Reservation, WaitlistQueue
+
+class ReservationQueueTest(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create_user(username=f'testuser{n}', password='1X<ISRUkw+tuK') for n in range(3)]
+        self.movie = Movie.objects.create(title='Movie Title', summary='My movie summary', year_of_production='2004')
+        self.copy = MovieInstance.objects.create(movie=self.movie, status='o', borrower=self.users[0])
+
+    def give_back(self, copy):
+        copy = MovieInstance.objects.get(pk=copy.pk)
+        copy.status = 'a'
+        copy.borrower = None
+        copy.save()
+        return copy
+
+    def test_tickets_are_issued_in_order(self):
+        tickets = [reservations.reserve(self.movie, user).ticket for user in self.users]
+        self.assertEqual(tickets, [1, 2, 3])
+        self.assertEqual(WaitlistQueue.objects.get(movie=self.movie).issued, 3)
+
+    def test_reserving_twice_keeps_place(self):
+        first = reservations.reserve(self.movie, self.users[1])
+        self.assertEqual(reservations.reserve(self.movie, self.users[1]), first)
+
+    def test_position_is_distance_to_head(self):
+        waiting = [reservations.reserve(self.movie, user) for user in self.users]
+        self.assertEqual([reservations.queue_position(r) for r in waiting], [1, 2, 3])
+        self.give_back(self.copy)
+        self.assertEqual(reservations.queue_position(waiting[2]), 2)
+
+    def test_returned_copy_goes_to_head_of_queue(self):
+        reservations.reserve(self.movie, self.users[1])
+        reservations.reserve(self.movie, self.users[2])
+        copy = self.give_back(self.copy)
+
+        self.assertEqual(copy.status, 'r')
+        self.assertEqual(copy.borrower, self.users[1])
+        copy.refresh_from_db()
+        self.assertEqual(copy.status, 'r')
+        self.assertEqual(Reservation.objects.get(user=self.users[1]).instance, copy)
+        self.assertTrue(Reservation.objects.get(user=self.users[2]).is_waiting)
+
+    def test_cancelled_reservations_are_skipped(self):
+        first = reservations.reserve(self.movie, self.users[1])
+        reservations.reserve(self.movie, self.users[2])
+        self.assertTrue(reservations.cancel(first))
+        copy = self.give_back(self.copy)
+        self.assertEqual(copy.borrower, self.users[2])
+
+    def test_waitlist_failure_does_not_fail_the_return(self):
+        reservations.reserve(self.movie, self.users[1])
+        with mock.patch('catalog.reservations.instance_changed', side_effect=IntegrityError):
+            copy = self.give_back(self.copy)
+        self.assertEqual(copy.status, 'a')
+        copy.refresh_from_db()
+        self.assertEqual(copy.status, 'a')
+        self.assertTrue(Reservation.objects.get(user=self.users[1]).is_waiting)
+
+        jobs.work(burst=True)
+        copy.refresh_from_db()
+        self.assertEqual((copy.status, copy.borrower), ('r', self.users[1]))
+
+    def test_copy_stays_available_without_queue(self):
+        self.assertEqual(self.give_back(self.copy).status, 'a')
+
+class ReservationViewTest(TestCase):
+    def setUp(self):
+        User.objects.create_user(username='testuser1', password='1X<ISRUkw+tuK')
+        self.movie = Movie.objects.create(title='Movie Title', summary='My movie summary', year_of_production='2004')
+        MovieInstance.objects.create(movie=self.movie, status='o')
+
+    def test_redirect_if_not_logged_in(self):
+        response = self.client.post(reverse('movie-reserve', args=[self.movie.pk]))
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.url.startswith('/accounts/login/'))
+
+    def test_join_and_leave_waiting_list(self):
+        self.client.login(username='testuser1', password='1X<ISRUkw+tuK')
+        response = self.client.post(reverse('movie-reserve', args=[self.movie.pk]))
+        self.assertRedirects(response, self.movie.get_absolute_url())
+
+        response = self.client.get(self.movie.get_absolute_url())
+        self.assertEqual(response.context['queue_position'], 1)
+
+        reservation = response.context['reservation']
+        self.client.post(reverse('reservation-cancel', args=[reservation.pk]))
+        response = self.client.get(self.movie.get_absolute_url())
+        self.assertIsNone(response.context['reservation'])
+
+class ParallelReturnsTest(TransactionTestCase):
+    def setUp(self):
+        self.movie = Movie.objects.create(title='Movie Title', summary='My movie summary', year_of_production='2004')
+        self.users = [User.objects.create(username=f'testuser{n}') for n in range(8)]
+        self.copies = [MovieInstance.objects.create(movie=self.movie, status='o') for _ in range(5)]
+        self.waiting = [reservations.reserve(self.movie, user) for user in self.users]
+
+    def retry_locked(self, func, attempts=200, delay=0.01):
+        # The in-memory test database fails concurrent writers instead of making them wait.
+        for attempt in range(attempts):
+            try:
+                return func()
+            except OperationalError:
+                if attempt == attempts - 1:
+                    raise
+                time.sleep(delay)
+
+    def give_back(self, copy, barrier):
+        # Each attempt starts from a fresh copy: a failed attempt is rolled back as a whole,
+        # while a retried save() of the same object would fail its version check. An attempt
+        # can also fail after committing, in an on_commit callback.
+        def attempt():
+            with transaction.atomic():
+                fresh = MovieInstance.objects.get(pk=copy.pk)
+                if fresh.status == 'o':
+                    fresh.status = 'a'
+                    fresh.save()
+
+        barrier.wait()
+        try:
+            self.retry_locked(attempt)
+        except Exception as exc:
+            self.errors.append(exc)
+        finally:
+            connection.close()
+
+    def test_parallel_returns_serve_queue_in_order(self):
+        barrier = threading.Barrier(len(self.copies))
+        self.errors = []
+        threads = [threading.Thread(target=self.give_back, args=(copy, barrier)) for copy in self.copies]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.errors, [])
+        served = Reservation.objects.filter(assigned__isnull=False)
+        self.assertEqual(sorted(served.values_list('ticket', flat=True)), [1, 2, 3, 4, 5])
+        self.assertEqual(len(set(served.values_list('instance', flat=True))), 5)
+        self.assertEqual(MovieInstance.objects.filter(status='r').count(), 5)
+        self.assertEqual(WaitlistQueue.objects.get(movie=self.movie).served, 5)
+        for reservation in served:
+            self.assertEqual(reservation.instance.borrower_id, reservation.user_id)
@@ -0,0 +1,98 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from catalog import slowlog
+from catalog.models import Movie, MovieInstance
+
+class FingerprintTest(TestCase):
+    def test_literals_and_lists_are_normalized(self):
+        first = 'SELECT "a"."id" FROM "a" WHERE "a"."t1" = %s AND "a"."id" IN (%s, %s)  LIMIT 10 OFFSET 20'
+        second = "SELECT \"a\".\"id\" FROM \"a\" WHERE \"a\".\"t1\" = 'x' AND \"a\".\"id\" IN (%s) LIMIT 10 OFFSET 40"
+        self.assertEqual(slowlog.normalize(first),
+                         'SELECT "a"."id" FROM "a" WHERE "a"."t1" = ? AND "a"."id" IN (...) LIMIT ? OFFSET ?')
+        self.assertEqual(slowlog.fingerprint(first), slowlog.fingerprint(second))
+        self.assertNotEqual(slowlog.fingerprint(first), slowlog.fingerprint('SELECT "b"."id" FROM "b"'))
+
+    def test_multi_row_inserts_collapse(self):
+        self.assertEqual(slowlog.normalize('INSERT INTO "a" ("x", "y") VALUES (%s, %s), (%s, %s), (%s, %s)'),
+                         'INSERT INTO "a" ("x", "y") VALUES (?, ?), ...')
+
+    def test_params_are_hashed(self):
+        self.assertNotIn('alice', slowlog.params_fingerprint(('alice',)))
+        self.assertNotEqual(slowlog.params_fingerprint((1,)), slowlog.params_fingerprint((2,)))
+        self.assertIsNone(slowlog.params_fingerprint(None))
+
+    def test_sampler_keeps_the_slowest_fingerprints(self):
+        sampler = slowlog.ExplainSampler(2)
+        self.assertTrue(sampler.wants('a', 0.1))
+        self.assertFalse(sampler.wants('a', 0.5))
+        self.assertTrue(sampler.wants('b', 0.3))
+        self.assertFalse(sampler.wants('c', 0.05))
+        self.assertTrue(sampler.wants('c', 0.2))
+        self.assertEqual(set(sampler.slowest), {'b', 'c'})
+
+class SlowQueryLogTest(TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.jsonl')
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+        self.movie = Movie.objects.create(title='Movie Title', summary='My movie summary', year_of_production='2004')
+        MovieInstance.objects.create(movie=self.movie, status='a')
+
+    def records(self):
+        with open(self.path) as log:
+            return [json.loads(line) for line in log]
+
+    def test_recorder_reports_origin_and_explain(self):
+        recorder = slowlog.SlowQueryRecorder(threshold_ms=0)
+        with connection.execute_wrapper(recorder):
+            list(Movie.objects.filter(title='Movie Title'))
+        records = list(recorder.records(slowlog.ExplainSampler(5), view='test'))
+        self.assertEqual(len(records), 1)
+        self.assertTrue(records[0]['origin'].startswith('catalog/tests/test_slowlog.py:'))
+        self.assertIn('catalog_movie', records[0]['explain'])
+        self.assertNotIn('Movie Title', json.dumps(records))
+
+    def test_recorder_ignores_fast_queries(self):
+        recorder = slowlog.SlowQueryRecorder(threshold_ms=60000)
+        with connection.execute_wrapper(recorder):
+            list(Movie.objects.all())
+        self.assertEqual(recorder.slow, [])
+
+    def test_requests_are_logged_with_the_view_name(self):
+        with override_settings(SLOW_QUERY_LOG={'PATH': self.path, 'THRESHOLD_MS': 0, 'EXPLAIN_SAMPLES': 50}):
+            self.client.get(reverse('movie-detail', args=[self.movie.pk]))
+        records = self.records()
+        self.assertTrue(records)
+        self.assertEqual({record['view'] for record in records}, {'movie-detail'})
+        # The copies and genres are queried while the template renders.
+        self.assertTrue(any(record['origin'].startswith('catalog/templates/catalog/')
+                            for record in records if record['origin']))
+        self.assertTrue(any(record.get('explain') for record in records))
+
+    def test_disabled_without_a_path(self):
+        with override_settings(SLOW_QUERY_LOG={'PATH': '', 'THRESHOLD_MS': 0}):
+            self.client.get(reverse('movies'))
+        self.assertEqual(self.records(), [])
+
+    def test_report_ranks_fingerprints(self):
+        with override_settings(SLOW_QUERY_LOG={'PATH': self.path, 'THRESHOLD_MS': 0, 'EXPLAIN_SAMPLES': 50}):
+            self.client.get(reverse('movie-detail', args=[self.movie.pk]))
+            self.client.get(reverse('index'))
+        with open(self.path, 'a') as log:
+            log.write('not json\n')
+        out, err = StringIO(), StringIO()
+        call_command('slowlog_report', self.path, '--top', '3', '--view', 'movie-detail', stdout=out, stderr=err)
+        report = out.getvalue()
+        self.assertIn('fingerprint', report)
+        self.assertIn('movie-detail (', report)
+        self.assertNotIn('index (', report)
+        self.assertIn('plan:', report)
+        self.assertIn('Skipped 1', err.getvalue())
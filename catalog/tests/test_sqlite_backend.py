@@ -0,0 +1,56 @@
+import sqlite3
+import tempfile
+from pathlib import Path
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import SimpleTestCase
+
+from JustWatchIt.db_backends.sqlite3.base import DatabaseWrapper
+
+class TunedSQLiteTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / 'tuned.sqlite3'
+
+    def wrapper(self, **options):
+        wrapper = DatabaseWrapper({**connection.settings_dict, 'NAME': str(self.path), 'OPTIONS': options})
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def pragma(self, wrapper, name):
+        with wrapper.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_are_applied_to_new_connections(self):
+        wrapper = self.wrapper()
+        self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(wrapper, 'synchronous'), 1)
+        self.assertEqual(self.pragma(wrapper, 'busy_timeout'), 5000)
+
+    def test_options_override_the_profile(self):
+        wrapper = self.wrapper(pragmas={'busy_timeout': 100}, transaction_mode='deferred')
+        self.assertEqual(self.pragma(wrapper, 'busy_timeout'), 100)
+        self.assertEqual(wrapper.transaction_mode, 'DEFERRED')
+
+    def test_unknown_transaction_mode(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.wrapper(transaction_mode='EAGER').connect()
+
+    def test_transactions_take_the_write_lock_up_front(self):
+        wrapper = self.wrapper()
+        with wrapper.cursor() as cursor:
+            cursor.execute('CREATE TABLE t (n integer)')
+        other = sqlite3.connect(self.path, timeout=0)
+        self.addCleanup(other.close)
+
+        # What atomic() does on SQLite: BEGIN while the connection stays in autocommit.
+        wrapper._start_transaction_under_autocommit()
+        try:
+            with self.assertRaisesMessage(sqlite3.OperationalError, 'locked'):
+                other.execute('INSERT INTO t VALUES (1)')
+        finally:
+            wrapper.connection.execute('ROLLBACK')
+        other.execute('INSERT INTO t VALUES (1)')
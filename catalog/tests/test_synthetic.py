@@ -0,0 +1,59 @@
+from collections import Counter
+from io import StringIO
+
+from django.contrib.auth import authenticate
+from django.test import TestCase
+
+from catalog.branches import rebuild_availability
+from catalog.management.commands import loadtest
+from catalog.models import BranchAvailability, Movie, MovieInstance, MovieLoanStats
+from catalog.synthetic import generate, PASSWORD
+
+class GenerateCatalogTest(TestCase):
+    def test_counts(self):
+        created = generate(movies=200, users=20, history=100, seed=1)
+        self.assertEqual(Movie.objects.count(), 200)
+        self.assertEqual(created['directors'], 20)
+        self.assertEqual(MovieInstance.objects.count(), created['copies'])
+        self.assertTrue(MovieInstance.objects.filter(status='o', borrower__isnull=False).exists())
+        self.assertTrue(MovieLoanStats.objects.exists())
+
+    def test_popularity_is_skewed(self):
+        generate(movies=500, users=10, history=0, seed=1)
+        per_director = sorted(Counter(Movie.objects.values_list('director_id', flat=True)).values(), reverse=True)
+        self.assertGreater(per_director[0], 5 * per_director[len(per_director) // 2])
+
+    def test_derived_tables_are_consistent(self):
+        generate(movies=100, users=10, history=0, seed=2)
+        counters = set(BranchAvailability.objects.values_list('branch_id', 'movie_id', 'copies', 'available'))
+        rebuild_availability()
+        self.assertEqual(set(BranchAvailability.objects.values_list('branch_id', 'movie_id', 'copies', 'available')), counters)
+
+    def test_users_can_log_in_and_rerun_adds_movies(self):
+        generate(movies=10, users=3, history=0)
+        self.assertIsNotNone(authenticate(username='loaduser0', password=PASSWORD))
+        self.assertTrue(authenticate(username='loaduserstaff', password=PASSWORD).has_perm('catalog.can_mark_returned'))
+        generate(movies=10, users=3, history=0)
+        self.assertEqual(Movie.objects.count(), 20)
+
+class LoadDriverTest(TestCase):
+    def test_requests_are_recorded_per_route(self):
+        generate(movies=30, users=5, history=20)
+        command = loadtest.Command(stdout=StringIO())
+        options = {'host': '127.0.0.1', 'seed': 0, 'login_share': 0.5, 'route': None, 'prefix': 'loaduser'}
+        command.prepare(options)
+        command.results, command.errors = {name: [] for name in command.routes}, {name: [] for name in command.routes}
+        # Driven in the test thread: other threads would not see the test transaction.
+        command.drive(0, float('inf'), max_requests=60)
+        self.assertFalse(any(command.errors.values()))
+        samples = [sample for samples in command.results.values() for sample in samples]
+        self.assertEqual(len(samples), 60)
+        # Cached pages may be served without a query, the others are counted.
+        self.assertTrue(any(queries > 0 for _, queries, _ in samples))
+        command.report(1.0)
+        self.assertIn('total', command.stdout.getvalue())
+
+    def test_routes_without_data_are_not_replayed(self):
+        command = loadtest.Command(stdout=StringIO())
+        command.prepare({'host': '127.0.0.1', 'seed': 0, 'login_share': 0.3, 'route': None, 'prefix': 'loaduser'})
+        self.assertEqual(set(command.routes), {'index', 'movies', 'screenwriters', 'directors', 'branches'})
@@ -0,0 +1,38 @@
+import uuid
+
+from django.contrib.auth.models import User, Permission
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog.models import Movie
+from catalog.templatetags.catalog_extras import row_url
+
+class RowUrlFilterTest(TestCase):
+    def test_matches_reverse_for_int_routes(self):
+        for name in ('movie-detail', 'movie-update', 'director-delete'):
+            self.assertEqual(row_url(42, name), reverse(name, args=[42]))
+
+    def test_matches_reverse_for_uuid_routes(self):
+        pk = uuid.uuid4()
+        self.assertEqual(row_url(pk, 'renew-movie-worker'), reverse('renew-movie-worker', args=[pk]))
+
+class ManagerLinksTest(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='testuser1', password='1X<ISRUkw+tuK', is_staff=True)
+        user.user_permissions.add(Permission.objects.get(name='Set movie as returned'))
+        User.objects.create_user(username='testuser2', password='2HJ1vRV0Z&3iD')
+        self.movie = Movie.objects.create(title='Movie Title', summary='My movie summary', year_of_production='2004')
+
+    def test_manager_sees_edit_links(self):
+        self.client.login(username='testuser1', password='1X<ISRUkw+tuK')
+        response = self.client.get(reverse('movies'))
+        self.assertTrue(response.context['can_manage'])
+        self.assertContains(response, reverse('movie-update', args=[self.movie.id]))
+        self.assertContains(response, reverse('loan-analytics'))
+
+    def test_other_users_do_not_see_edit_links(self):
+        self.client.login(username='testuser2', password='2HJ1vRV0Z&3iD')
+        response = self.client.get(reverse('movies'))
+        self.assertFalse(response.context['can_manage'])
+        self.assertNotContains(response, reverse('movie-update', args=[self.movie.id]))
+        self.assertNotContains(response, reverse('loan-analytics'))
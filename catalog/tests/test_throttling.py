@@ -0,0 +1,115 @@
+from django.contrib.auth.hashers import check_password, make_password
+from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_login_failed
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from catalog import throttling
+from catalog.models import ThrottleCounter
+
+THROTTLE = {'WINDOW': 60, 'IP_LIMIT': 10, 'USERNAME_LIMIT': 3}
+
+class SlidingWindowTest(TestCase):
+    def test_previous_window_is_weighted_by_overlap(self):
+        for _ in range(10):
+            throttling.hit('scope', 'ident', 60, now=30.0)
+        self.assertEqual(throttling.attempts('scope', 'ident', 60, now=59.0), 10)
+        self.assertAlmostEqual(throttling.attempts('scope', 'ident', 60, now=75.0), 7.5)
+        self.assertEqual(throttling.attempts('scope', 'ident', 60, now=125.0), 0)
+
+    def test_reset_clears_both_windows(self):
+        throttling.hit('scope', 'ident', 60, now=30.0)
+        throttling.hit('scope', 'ident', 60, now=70.0)
+        throttling.reset('scope', 'ident', 60, now=70.0)
+        self.assertEqual(throttling.attempts('scope', 'ident', 60, now=70.0), 0)
+
+@override_settings(LOGIN_THROTTLE={'STORE': 'database'})
+class DatabaseSlidingWindowTest(SlidingWindowTest):
+    def test_hits_update_one_row_per_window(self):
+        for _ in range(5):
+            throttling.hit('scope', 'ident', 60, now=30.0)
+        self.assertEqual(ThrottleCounter.objects.get().count, 5)
+
+    def test_expired_windows_are_removed(self):
+        throttling.hit('scope', 'ident', 60, now=30.0)
+        throttling.hit('scope', 'other', 60, now=500.0)
+        self.assertEqual(ThrottleCounter.objects.count(), 1)
+
+@override_settings(LOGIN_THROTTLE=THROTTLE)
+class LoginThrottleTest(TestCase):
+    def setUp(self):
+        User.objects.create_user(username='testuser1', password='1X<ISRUkw+tuK')
+        self.failures = []
+        user_login_failed.connect(self.record_failure)
+
+    def tearDown(self):
+        user_login_failed.disconnect(self.record_failure)
+
+    def record_failure(self, **kwargs):
+        self.failures.append(kwargs)
+
+    def login(self, password, username='testuser1', ip='10.0.0.1'):
+        return self.client.post(reverse('login'), {'username': username, 'password': password}, REMOTE_ADDR=ip)
+
+    def test_username_is_throttled_before_password_check(self):
+        for _ in range(3):
+            self.assertEqual(self.login('wrong').status_code, 200)
+        response = self.login('1X<ISRUkw+tuK')
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(response.context['throttled'])
+        self.assertEqual(len(self.failures), 3)
+
+    def test_ip_is_throttled_across_usernames(self):
+        for n in range(10):
+            self.login('wrong', username=f'victim{n}')
+        self.assertEqual(self.login('1X<ISRUkw+tuK').status_code, 429)
+        self.assertEqual(self.login('1X<ISRUkw+tuK', ip='10.0.0.2').status_code, 302)
+
+    def test_admin_login_is_throttled_too(self):
+        for _ in range(3):
+            self.assertEqual(self.client.post(reverse('admin:login'), {'username': 'testuser1', 'password': 'wrong'},
+                                              REMOTE_ADDR='10.0.0.1').status_code, 200)
+        response = self.client.post(reverse('admin:login'), {'username': 'testuser1', 'password': '1X<ISRUkw+tuK'},
+                                    REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 429)
+        self.assertContains(response, 'Too many login attempts', status_code=429)
+        self.assertEqual(self.login('1X<ISRUkw+tuK').status_code, 429)
+
+    def test_admin_login_still_works(self):
+        User.objects.create_user(username='admin1', password='2HJ1vRV0Z&3iD', is_staff=True)
+        self.assertContains(self.client.get(reverse('admin:login')), 'id_username')
+        response = self.client.post(reverse('admin:login'), {'username': 'admin1', 'password': '2HJ1vRV0Z&3iD',
+                                                             'next': reverse('admin:index')})
+        self.assertRedirects(response, reverse('admin:index'))
+
+    def test_successful_login_resets_username_counter(self):
+        self.login('wrong')
+        self.login('wrong')
+        self.assertEqual(self.login('1X<ISRUkw+tuK').status_code, 302)
+        self.client.logout()
+        self.login('wrong')
+        self.assertEqual(self.login('1X<ISRUkw+tuK').status_code, 302)
+
+class HasherPolicyTest(TestCase):
+    @override_settings(PASSWORD_HASHERS=['catalog.hashers.ScryptPasswordHasher'])
+    def test_scrypt_round_trip(self):
+        encoded = make_password('1X<ISRUkw+tuK')
+        self.assertTrue(encoded.startswith('scrypt$16384$'))
+        self.assertTrue(check_password('1X<ISRUkw+tuK', encoded))
+        self.assertFalse(check_password('wrong', encoded))
+
+    @override_settings(PASSWORD_HASHERS=[
+        'catalog.hashers.ScryptPasswordHasher', 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    ])
+    def test_existing_hashes_are_upgraded(self):
+        with self.settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.PBKDF2PasswordHasher']):
+            user = User.objects.create_user(username='testuser1', password='1X<ISRUkw+tuK')
+        self.assertTrue(user.check_password('1X<ISRUkw+tuK'))
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('scrypt$'))
+
+@override_settings(LOGIN_THROTTLE={**THROTTLE, 'STORE': 'database'})
+class DatabaseLoginThrottleTest(LoginThrottleTest):
+    def test_failures_are_counted_in_the_database(self):
+        self.login('wrong')
+        self.assertEqual(ThrottleCounter.objects.count(), 2)
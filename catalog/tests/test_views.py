@@ -3,9 +3,11 @@ from django.urls import reverse
 import datetime
 from django.utils import timezone
 from django.contrib.auth.models import User, Permission
-from catalog.forms import RenewMovieForm
+from catalog.forms import RenewMovieForm, CONFLICT_MESSAGE
 from catalog.models import Screenwriter, Director, MovieInstance, Movie, Genre
 import uuid
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 class ScreenwritersListViewTest(TestCase):
     @classmethod
@@ -140,6 +142,49 @@ class LoanedMovieInstancesByUserListViewTest(TestCase):
                 self.assertTrue(last_date <= movie.due_back)
                 last_date = movie.due_back
 
+    def test_loans_are_bucketed_by_due_date(self):
+        today = datetime.date.today()
+        copies = MovieInstance.objects.filter(borrower__username='testuser1')[:3]
+        for copy, due_back in zip(copies, [today - datetime.timedelta(days=1), today + datetime.timedelta(days=2), today + datetime.timedelta(days=10)]):
+            copy.status, copy.due_back = 'o', due_back
+            copy.save()
+
+        login = self.client.login(username='testuser1', password='1X<ISRUkw+tuK')
+        response = self.client.get(reverse('my-borrowed'))
+        self.assertEqual([movie.due_bucket for movie in response.context['movieinstance_list']], ['overdue', 'due-soon', 'ok'])
+        self.assertContains(response, 'Overdue')
+
+    def test_query_count_does_not_grow_with_loans(self):
+        user1, user2 = User.objects.get(username='testuser1'), User.objects.get(username='testuser2')
+        for copy in MovieInstance.objects.filter(borrower=user1)[:2]:
+            copy.status = 'o'
+            copy.save()
+        for copy in MovieInstance.objects.filter(borrower=user2)[:10]:
+            copy.status = 'o'
+            copy.save()
+
+        counts = []
+        for username, password in (('testuser1', '1X<ISRUkw+tuK'), ('testuser2', '2HJ1vRV0Z&3iD')):
+            self.client.login(username=username, password=password)
+            self.client.get(reverse('my-borrowed'))
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse('my-borrowed'))
+            counts.append(len(queries))
+        self.assertEqual(len(response.context['movieinstance_list']), 10)
+        self.assertEqual(counts[0], counts[1])
+
+    def test_sidebar_count_follows_returns(self):
+        copy = MovieInstance.objects.filter(borrower__username='testuser1').first()
+        copy.status = 'o'
+        copy.save()
+        login = self.client.login(username='testuser1', password='1X<ISRUkw+tuK')
+        self.assertEqual(self.client.get(reverse('index')).context['borrowed_count'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            copy.status = 'a'
+            copy.save()
+        self.assertEqual(self.client.get(reverse('index')).context['borrowed_count'], 0)
+
 class RenewMovieInstancesViewTest(TestCase):
     def setUp(self):
         test_user1 = User.objects.create_user(username='testuser1', password='1X<ISRUkw+tuK')
@@ -244,3 +289,52 @@ class RenewMovieInstancesViewTest(TestCase):
         response = self.client.post(reverse('renew-movie-worker', kwargs={'pk': self.test_movieinstance1.pk}), {'renewal_date': invalid_date_in_future})
         self.assertEqual(response.status_code, 200)
         self.assertFormError(response, 'form', 'renewal_date', 'Invalid date - renewal more than 4 weeks ahead')
+
+    def test_renewal_of_a_changed_copy_is_reported(self):
+        login = self.client.login(username='testuser2', password='2HJ1vRV0Z&3iD')
+        url = reverse('renew-movie-worker', kwargs={'pk': self.test_movieinstance1.pk})
+        loaded = self.client.get(url).context['form'].initial['version']
+        other = MovieInstance.objects.get(pk=self.test_movieinstance1.pk)
+        other.due_back = datetime.date.today() + datetime.timedelta(weeks=1)
+        other.save()
+
+        renewal = {'renewal_date': datetime.date.today() + datetime.timedelta(weeks=2), 'version': loaded}
+        response = self.client.post(url, renewal)
+        self.assertEqual(response.status_code, 200)
+        self.assertFormError(response, 'form', None, CONFLICT_MESSAGE)
+        self.assertEqual(MovieInstance.objects.get(pk=other.pk).due_back, other.due_back)
+
+        renewal['version'] = response.context['form']['version'].value()
+        self.assertRedirects(self.client.post(url, renewal), reverse('all-borrowed'))
+        self.assertEqual(MovieInstance.objects.get(pk=other.pk).due_back, renewal['renewal_date'])
+
+class DirectorUpdateViewTest(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='testuser2', password='2HJ1vRV0Z&3iD')
+        user.user_permissions.add(Permission.objects.get(name='Set movie as returned'))
+        self.director = Director.objects.create(first_name='Michael', last_name='Cash')
+        self.client.login(username='testuser2', password='2HJ1vRV0Z&3iD')
+
+    def test_concurrent_edit_is_reported(self):
+        url = reverse('director-update', args=[self.director.pk])
+        version = self.client.get(url).context['form']['version'].value()
+        Director.objects.filter(pk=self.director.pk).update(first_name='Mike', version=version + 1)
+
+        response = self.client.post(url, {'first_name': 'Michael', 'last_name': 'Kesh', 'version': version})
+        self.assertEqual(response.status_code, 200)
+        self.assertFormError(response, 'form', None, CONFLICT_MESSAGE)
+        self.assertEqual(Director.objects.get(pk=self.director.pk).last_name, 'Cash')
+
+    def test_edit_with_current_version_is_saved(self):
+        url = reverse('director-update', args=[self.director.pk])
+        version = self.client.get(url).context['form']['version'].value()
+        response = self.client.post(url, {'first_name': 'Michael', 'last_name': 'Kesh', 'version': version})
+        self.assertRedirects(response, self.director.get_absolute_url())
+        self.assertEqual(Director.objects.get(pk=self.director.pk).version, version + 1)
+
+    def test_edit_without_version_is_rejected(self):
+        url = reverse('director-update', args=[self.director.pk])
+        response = self.client.post(url, {'first_name': 'Michael', 'last_name': 'Kesh', 'version': ''})
+        self.assertEqual(response.status_code, 200)
+        self.assertFormError(response, 'form', 'version', 'This field is required.')
+        self.assertEqual(Director.objects.get(pk=self.director.pk).last_name, 'Cash')
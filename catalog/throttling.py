@@ -0,0 +1,126 @@
+import datetime
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import ThrottleCounter
+
+DEFAULT_LOGIN_THROTTLE = {
+    'WINDOW': 300,
+    'IP_LIMIT': 30,
+    'USERNAME_LIMIT': 5,
+    'TRUSTED_PROXIES': 0,
+    # 'cache' counts with add/incr in the default cache, atomic on Redis; 'database'
+    # is the fallback for deployments without it, at the price of a write per failure.
+    'STORE': 'cache',
+}
+
+
+def login_throttle_settings():
+    return {**DEFAULT_LOGIN_THROTTLE, **getattr(settings, 'LOGIN_THROTTLE', {})}
+
+
+def _keys(scope, identity, window, now):
+    # Identities are hashed so arbitrary usernames make valid, bounded keys.
+    digest = hashlib.sha1(identity.encode()).hexdigest()
+    current = int(now // window)
+    return f'throttle:{scope}:{digest}:{current}', f'throttle:{scope}:{digest}:{current - 1}'
+
+
+def _in_database():
+    return login_throttle_settings()['STORE'] == 'database'
+
+
+def attempts(scope, identity, window, now=None):
+    """
+    Sliding window counter: the current fixed window plus the previous one weighted
+    by how much of it still overlaps the sliding window.
+    """
+    now = time.time() if now is None else now
+    current, previous = _keys(scope, identity, window, now)
+    if _in_database():
+        counts = dict(ThrottleCounter.objects.filter(key__in=[current, previous]).values_list('key', 'count'))
+    else:
+        counts = caches['default'].get_many([current, previous])
+    overlap = 1 - (now % window) / window
+    return counts.get(current, 0) + counts.get(previous, 0) * overlap
+
+
+def hit(scope, identity, window, now=None):
+    now = time.time() if now is None else now
+    current, _ = _keys(scope, identity, window, now)
+    if _in_database():
+        _hit_row(current, window, now)
+        return
+    cache = caches['default']
+    cache.add(current, 0, window * 2)
+    try:
+        cache.incr(current)
+    except ValueError:
+        # Expired between add and incr.
+        cache.set(current, 1, window * 2)
+
+
+def _timestamp(seconds):
+    return datetime.datetime.fromtimestamp(seconds, tz=datetime.timezone.utc)
+
+
+def _hit_row(key, window, now):
+    # A row updated with F() so parallel failures are all counted, in every worker.
+    if ThrottleCounter.objects.filter(key=key).update(count=F('count') + 1):
+        return
+    try:
+        with transaction.atomic():
+            ThrottleCounter.objects.create(key=key, count=1, expires=_timestamp(now + window * 2))
+    except IntegrityError:
+        # Created by a concurrent failure in the meantime.
+        ThrottleCounter.objects.filter(key=key).update(count=F('count') + 1)
+        return
+    # Each new window row pays for removing the rows that have run out.
+    ThrottleCounter.objects.filter(expires__lt=_timestamp(now)).delete()
+
+
+def reset(scope, identity, window, now=None):
+    now = time.time() if now is None else now
+    keys = _keys(scope, identity, window, now)
+    if _in_database():
+        ThrottleCounter.objects.filter(key__in=keys).delete()
+    else:
+        caches['default'].delete_many(keys)
+
+
+def client_ip(request, trusted_proxies=0):
+    if trusted_proxies:
+        forwarded = [ip.strip() for ip in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if ip.strip()]
+        if len(forwarded) >= trusted_proxies:
+            return forwarded[-trusted_proxies]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def _login_identities(request, username):
+    config = login_throttle_settings()
+    identities = [('login-ip', client_ip(request, config['TRUSTED_PROXIES']), config['IP_LIMIT'])]
+    if username:
+        identities.append(('login-username', username.lower(), config['USERNAME_LIMIT']))
+    return config['WINDOW'], identities
+
+
+def login_throttled(request, username):
+    window, identities = _login_identities(request, username)
+    return any(limit is not None and attempts(scope, identity, window) >= limit
+               for scope, identity, limit in identities)
+
+
+def login_failed(request, username):
+    window, identities = _login_identities(request, username)
+    for scope, identity, _ in identities:
+        hit(scope, identity, window)
+
+
+def login_succeeded(request, username):
+    window, _ = _login_identities(request, username)
+    reset('login-username', username.lower(), window)
@@ -5,12 +5,18 @@ urlpatterns = [
     path('', views.index, name='index'),
     path('movies/', views.MoviesListView.as_view(), name='movies'),
     path('movie/<int:pk>', views.MovieDetailView.as_view(), name='movie-detail'),
+    path('movie/<int:pk>/reserve/', views.reserve_movie, name='movie-reserve'),
+    path('reservation/<int:pk>/cancel/', views.cancel_reservation, name='reservation-cancel'),
     path('screenwriters/', views.ScreenwritersListView.as_view(), name='screenwriters'),
     path('screenwriter/<int:pk>', views.ScreenwriterDetailView.as_view(), name='screenwriter-detail'),
     path('directors/', views.DirectorsListView.as_view(), name='directors'),
     path('director/<int:pk>', views.DirectorDetailView.as_view(), name='director-detail'),
+    path('branches/', views.BranchesListView.as_view(), name='branches'),
+    path('branch/<int:pk>', views.BranchDetailView.as_view(), name='branch-detail'),
     path('mymovies/', views.LoanedMoviesByUserListView.as_view(), name='my-borrowed'),
     path('borrowed/', views.LoanedMoviesListView.as_view(), name='all-borrowed'),
+    path('analytics/', views.LoanAnalyticsView.as_view(), name='loan-analytics'),
+    path('analytics/export/', views.export_loan_history, name='loan-history-export'),
     path('movie/<uuid:pk>/renew/', views.renew_movie_worker, name='renew-movie-worker'),
     path('screenwriter/create/', views.ScreenwriterCreate.as_view(), name='screenwriter-create'),
     path('screenwriter/<int:pk>/update/', views.ScreenwriterUpdate.as_view(), name='screenwriter-update'),
@@ -1,47 +1,140 @@
 from django.shortcuts import render, get_object_or_404
-from .models import Movie, Screenwriter, Director, MovieInstance, Genre
+from .models import ConcurrentUpdateError, Movie, Screenwriter, Director, MovieInstance, Genre, MovieNeighbour, Reservation, Branch, BranchAvailability, MovieLoanStats, UserLoanStats, InstanceLoanStats
 from django.views import generic
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
+from django.contrib.auth import views as auth_views, REDIRECT_FIELD_NAME
+from django.contrib import admin
+from django.contrib.admin.forms import AdminAuthenticationForm
 import datetime
 from django.http import HttpResponseRedirect
 from django.urls import reverse, reverse_lazy
-from catalog.forms import RenewMovieForm
+from catalog.forms import RenewMovieForm, VersionedModelForm, report_conflict
+from django.forms import modelform_factory
 from django.contrib.auth.decorators import login_required, permission_required
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
-
+from django.views.decorators.http import require_POST
+from catalog import branches, reservations, throttling, tasks
+from django.core.paginator import Paginator
+from django.db.models import Case, CharField, F, Value, When
+from django.contrib import messages
+from catalog.cache import get_or_set, INDEX_COUNTS_KEY, MOVIES_FIRST_PAGE_KEY
+
+
+def index_counts():
+    return {
+        'num_movies': Movie.objects.all().count(),
+        'num_instances': MovieInstance.objects.all().count(),
+        'num_instances_available': MovieInstance.objects.filter(status__exact='a').count(),
+        'num_screenwriters': Screenwriter.objects.count(),
+        'num_directors': Director.objects.count(),
+        'num_genres': Genre.objects.count(),
+    }
 
 def index(request):
-    num_movies = Movie.objects.all().count()
-    num_instances = MovieInstance.objects.all().count()
-
-
-    num_instances_available = MovieInstance.objects.filter(status__exact='a').count()
-
-    num_screenwriters = Screenwriter.objects.count()
-    num_directors = Director.objects.count()
-    num_genres = Genre.objects.count()
+    counts = get_or_set(INDEX_COUNTS_KEY, index_counts, timeout=60)
     num_visits = request.session.get('num_visits', 0)
     request.session['num_visits'] = num_visits + 1
 
     context = {
-        'num_movies': num_movies,
-        'num_instances': num_instances,
-        'num_instances_available': num_instances_available,
-        'num_screenwriters': num_screenwriters,
-        'num_directors': num_directors,
-        'num_genres': num_genres,
+        **counts,
         'num_visits': num_visits,
     }
 
     return render(request, 'index.html', context=context)
 
+class ThrottledLoginView(auth_views.LoginView):
+    def post(self, request, *args, **kwargs):
+        # Checked before the form is validated, so throttled attempts never hash a password.
+        if throttling.login_throttled(request, request.POST.get('username', '')):
+            context = self.get_context_data(form=self.get_form_class()(request), throttled=True)
+            return self.render_to_response(context, status=429)
+        return super().post(request, *args, **kwargs)
+
+    def form_valid(self, form):
+        throttling.login_succeeded(self.request, form.get_user().get_username())
+        return super().form_valid(form)
+
+    def form_invalid(self, form):
+        throttling.login_failed(self.request, self.request.POST.get('username', ''))
+        return super().form_invalid(form)
+
+class ThrottledAdminLoginView(ThrottledLoginView):
+    # AdminSite.login rebuilt on the throttled view, so the admin is no side door.
+    template_name = 'admin/login.html'
+    authentication_form = AdminAuthenticationForm
+
+    def get(self, request, *args, **kwargs):
+        if admin.site.has_permission(request):
+            return HttpResponseRedirect(reverse('admin:index'))
+        return super().get(request, *args, **kwargs)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context.update(admin.site.each_context(self.request), title='Log in',
+                       app_path=self.request.get_full_path(), username=self.request.user.get_username())
+        if REDIRECT_FIELD_NAME not in self.request.GET and REDIRECT_FIELD_NAME not in self.request.POST:
+            context[REDIRECT_FIELD_NAME] = reverse('admin:index')
+        return context
+
 class MoviesListView(generic.ListView):
     model = Movie
+    queryset = Movie.objects.select_related('screenwriter', 'director')
     paginate_by = 10
 
+    def paginate_queryset(self, queryset, page_size):
+        if self.request.GET.get(self.page_kwarg, '1') != '1':
+            return super().paginate_queryset(queryset, page_size)
+
+        def first_page():
+            return queryset.count(), list(queryset[:page_size + self.get_paginate_orphans()])
+
+        count, movies = get_or_set(MOVIES_FIRST_PAGE_KEY, first_page, timeout=60)
+        paginator = self.get_paginator(queryset, page_size, orphans=self.get_paginate_orphans(),
+                                       allow_empty_first_page=self.get_allow_empty())
+        paginator.count = count
+        page = paginator.page(1)
+        page.object_list = movies[:page.end_index()]
+        return paginator, page, page.object_list, page.has_other_pages()
+
 class MovieDetailView(generic.DetailView):
     model = Movie
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        neighbours = MovieNeighbour.objects.filter(movie=self.object).select_related('neighbour')
+        context['similar_movies'] = [neighbour.neighbour for neighbour in neighbours]
+        context['copies'] = self.object.movieinstance_set.select_related('branch')
+        context['city'] = near_city(self.request)
+        context['available_branches'] = branches.available_at(self.object, context['city'])
+        if self.request.user.is_authenticated:
+            reservation = reservations.active_reservation(self.object, self.request.user)
+            context['reservation'] = reservation
+            context['copies_available'] = self.object.movieinstance_set.filter(status__exact='a').count()
+            if reservation is not None:
+                context['queue_position'] = reservations.queue_position(reservation)
+        return context
+
+def near_city(request):
+    """The city "near me" refers to: ?city= when given, remembered in the session for later pages."""
+    if 'city' in request.GET:
+        request.session['city'] = request.GET['city'].strip()
+    return request.session.get('city', '')
+
+@login_required
+@require_POST
+def reserve_movie(request, pk):
+    movie = get_object_or_404(Movie, pk=pk)
+    if not movie.movieinstance_set.filter(status__exact='a').exists():
+        reservations.reserve(movie, request.user)
+    return HttpResponseRedirect(movie.get_absolute_url())
+
+@login_required
+@require_POST
+def cancel_reservation(request, pk):
+    reservation = get_object_or_404(Reservation, pk=pk, user=request.user)
+    reservations.cancel(reservation)
+    return HttpResponseRedirect(reservation.movie.get_absolute_url())
+
 class ScreenwritersListView(generic.ListView):
     model = Screenwriter
     paginate_by = 10
@@ -56,13 +149,45 @@ class DirectorsListView(generic.ListView):
 class DirectorDetailView(generic.DetailView):
     model = Director
 
+class BranchesListView(generic.ListView):
+    model = Branch
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        city = self.request.GET.get('city', '').strip()
+        return queryset.filter(city__iexact=city) if city else queryset
+
+class BranchDetailView(generic.DetailView):
+    model = Branch
+    paginate_by = 10
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        counters = BranchAvailability.objects.filter(branch=self.object, copies__gt=0) \
+            .select_related('movie').order_by('movie__title', 'movie_id')
+        page_obj = Paginator(counters, self.paginate_by).get_page(self.request.GET.get('page'))
+        context.update(page_obj=page_obj, is_paginated=page_obj.has_other_pages(), availability_list=page_obj.object_list)
+        return context
+
 class LoanedMoviesByUserListView(LoginRequiredMixin,generic.ListView):
     model = MovieInstance
     template_name ='catalog/movieinstance_list_borrowed_user.html'
     paginate_by = 10
 
+    due_soon = datetime.timedelta(days=3)
+
     def get_queryset(self):
-        return MovieInstance.objects.filter(borrower=self.request.user).filter(status__exact='o').order_by('due_back')
+        # Bucketed in SQL against one date, so rows are never compared with date.today() one by one.
+        today = datetime.date.today()
+        return MovieInstance.objects.filter(borrower=self.request.user).filter(status__exact='o') \
+            .select_related('movie') \
+            .annotate(due_bucket=Case(
+                When(due_back__lt=today, then=Value('overdue')),
+                When(due_back__lte=today + self.due_soon, then=Value('due-soon')),
+                default=Value('ok'),
+                output_field=CharField(),
+            )) \
+            .order_by(F('due_back').asc(nulls_last=True))
 
 class LoanedMoviesListView(PermissionRequiredMixin, generic.ListView):
     model = MovieInstance
@@ -71,7 +196,27 @@ class LoanedMoviesListView(PermissionRequiredMixin, generic.ListView):
     permission_required = 'catalog.can_mark_returned'
 
     def get_queryset(self):
-        return MovieInstance.objects.filter(status__exact='o').order_by('due_back')
+        return MovieInstance.objects.filter(status__exact='o').select_related('movie', 'borrower').order_by('due_back')
+
+class LoanAnalyticsView(PermissionRequiredMixin, generic.TemplateView):
+    template_name = 'catalog/loan_analytics.html'
+    permission_required = 'catalog.can_mark_returned'
+    top_size = 10
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['top_movies'] = MovieLoanStats.objects.select_related('movie').filter(loan_count__gt=0)[:self.top_size]
+        context['top_users'] = UserLoanStats.objects.select_related('user').filter(loan_count__gt=0)[:self.top_size]
+        context['busiest_copies'] = InstanceLoanStats.objects.select_related('movie')[:self.top_size]
+        return context
+
+@login_required
+@permission_required('catalog.can_mark_returned', raise_exception=True)
+@require_POST
+def export_loan_history(request):
+    tasks.export_loan_history.delay(user_id=request.user.pk)
+    messages.success(request, f'The loan history export will be emailed to {request.user.email or "your address"}.')
+    return HttpResponseRedirect(reverse('loan-analytics'))
 
 @login_required
 @permission_required('catalog.can_mark_returned', raise_exception=True)
@@ -84,13 +229,19 @@ def renew_movie_worker(request, pk):
 
         if form.is_valid():
             movie_instance.due_back = form.cleaned_data['renewal_date']
-            movie_instance.save()
-
-            return HttpResponseRedirect(reverse('all-borrowed') )
+            if form.cleaned_data['version'] is not None:
+                movie_instance.version = form.cleaned_data['version']
+            try:
+                movie_instance.save()
+            except ConcurrentUpdateError:
+                movie_instance = get_object_or_404(MovieInstance, pk=pk)
+                report_conflict(form, movie_instance.version)
+            else:
+                return HttpResponseRedirect(reverse('all-borrowed') )
 
     else:
         proposed_renewal_date = datetime.date.today() + datetime.timedelta(weeks=3)
-        form = RenewMovieForm(initial={'renewal_date': proposed_renewal_date})
+        form = RenewMovieForm(initial={'renewal_date': proposed_renewal_date, 'version': movie_instance.version})
 
     context = {
         'form': form,
@@ -99,12 +250,24 @@ def renew_movie_worker(request, pk):
 
     return render(request, 'catalog/movie_renew_worker.html', context)
 
+class OptimisticUpdateMixin:
+    """Saves only changed columns and turns a concurrent edit into a form error."""
+    def get_form_class(self):
+        return modelform_factory(self.model, form=VersionedModelForm, fields=self.fields)
+
+    def form_valid(self, form):
+        try:
+            return super().form_valid(form)
+        except ConcurrentUpdateError:
+            report_conflict(form, self.model.objects.values_list('version', flat=True).get(pk=self.object.pk))
+            return self.form_invalid(form)
+
 class ScreenwriterCreate(PermissionRequiredMixin, CreateView):
     model = Screenwriter
     fields = ['first_name', 'last_name', 'date_of_birth', 'date_of_death']
     permission_required = 'catalog.can_mark_returned'
 
-class ScreenwriterUpdate(PermissionRequiredMixin, UpdateView):
+class ScreenwriterUpdate(PermissionRequiredMixin, OptimisticUpdateMixin, UpdateView):
     model = Screenwriter
     fields = '__all__'
     permission_required = 'catalog.can_mark_returned'
@@ -119,7 +282,7 @@ class DirectorCreate(PermissionRequiredMixin, CreateView):
     fields = ['first_name', 'last_name', 'date_of_birth', 'date_of_death']
     permission_required = 'catalog.can_mark_returned'
 
-class DirectorUpdate(PermissionRequiredMixin, UpdateView):
+class DirectorUpdate(PermissionRequiredMixin, OptimisticUpdateMixin, UpdateView):
     model = Director
     fields = '__all__'
     permission_required = 'catalog.can_mark_returned'
@@ -134,7 +297,7 @@ class MovieCreate(PermissionRequiredMixin, CreateView):
     fields = ['title', 'screenwriter', 'director', 'summary', 'year_of_production', 'genre']
     permission_required = 'catalog.can_mark_returned'
 
-class MovieUpdate(PermissionRequiredMixin, UpdateView):
+class MovieUpdate(PermissionRequiredMixin, OptimisticUpdateMixin, UpdateView):
     model = Movie
     fields = '__all__'
     permission_required = 'catalog.can_mark_returned'